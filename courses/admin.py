@@ -1,21 +1,59 @@
 from django.contrib import admin
+from django.urls import reverse
+from django.utils.html import format_html
 from .models import Subject, Course, Module
+from .paginator import EstimatedCountPaginator
 
 
 @admin.register(Subject)
 class SubjectAdmin(admin.ModelAdmin):
     list_display = ['title', 'slug']
     prepopulated_fields = {'slug': ('title',)}
+    # Нужно для autocomplete_fields в CourseAdmin.
+    search_fields = ['title']
 
 
 class ModuleInline(admin.StackedInline):
     model = Module
 
 
+@admin.register(Module)
+class ModuleAdmin(admin.ModelAdmin):
+    # Отдельный список модулей для курсов, у которых модулей слишком много для встроенной формы.
+    list_display = ['title', 'course', 'order']
+    list_select_related = ['course']
+    raw_id_fields = ['course']
+    search_fields = ['title']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
 @admin.register(Course)
 class CourseAdmin(admin.ModelAdmin):
-    list_display = ['title', 'subject', 'created']
+    list_display = ['title', 'subject', 'owner', 'created']
     list_filter = ['created', 'subject']
-    search_fields = ['title', 'overview']
+    list_select_related = ['subject', 'owner']
+    # Поиск только по названию: для UPPER(title) есть триграммный индекс (миграция 0008),
+    # а ILIKE по overview всегда приводил к полному сканированию таблицы.
+    search_fields = ['title']
     prepopulated_fields = {'slug': ('title',)}
+    autocomplete_fields = ['subject', 'owner']
+    readonly_fields = ['modules_link']
     inlines = [ModuleInline]
+    paginator = EstimatedCountPaginator
+    # Не выполняем COUNT(*) по всей таблице ради строки "N total".
+    show_full_result_count = False
+    # Курсы с большим количеством модулей редактируются через список модулей, а не встроенной формой.
+    module_inline_limit = 50
+
+    def get_inlines(self, request, obj):
+        if obj is not None and obj.modules.count() > self.module_inline_limit:
+            return []
+        return super(CourseAdmin, self).get_inlines(request, obj)
+
+    def modules_link(self, obj):
+        if obj is None or obj.pk is None:
+            return '-'
+        url = '{}?course__id__exact={}'.format(reverse('admin:courses_module_changelist'), obj.pk)
+        return format_html('<a href="{}">Edit modules</a>', url)
+    modules_link.short_description = 'Modules'
@@ -0,0 +1,116 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .buffers import WriteBehindBuffer
+from .models import Course, Module, CourseViewStat
+
+# Длительность интервала сводной статистики в секундах (по умолчанию – час).
+BUCKET_SECONDS = getattr(settings, 'COURSE_VIEWS_BUCKET_SECONDS', 3600)
+POPULAR_DAYS = getattr(settings, 'POPULAR_COURSES_DAYS', 30)
+
+
+def bucket_for(dt):
+    ts = int(dt.timestamp())
+    return dt - timedelta(seconds=ts % BUCKET_SECONDS, microseconds=dt.microsecond)
+
+
+def _upsert_sql(rows, with_module):
+    table = connection.ops.quote_name(CourseViewStat._meta.db_table)
+    if with_module:
+        columns, conflict, where = 'course_id, module_id, bucket', 'course_id, module_id, bucket', 'module_id IS NOT NULL'
+        placeholders = '(%s, %s, %s, %s)'
+    else:
+        columns, conflict, where = 'course_id, bucket', 'course_id, bucket', 'module_id IS NULL'
+        placeholders = '(%s, %s, %s)'
+    # Условие WHERE в ON CONFLICT выбирает частичный уникальный индекс из CourseViewStat.Meta.constraints.
+    return ('INSERT INTO {table} ({columns}, views) VALUES {values} '
+            'ON CONFLICT ({conflict}) WHERE {where} DO UPDATE SET '
+            'views = {table}.views + EXCLUDED.views').format(
+        table=table, columns=columns, values=', '.join([placeholders] * rows),
+        conflict=conflict, where=where)
+
+
+def flush_views(items):
+    # Счетчики из буфера добавляются к строкам сводной таблицы одним INSERT ... ON CONFLICT на пачку.
+    course_ids = set(Course.objects.filter(id__in={course_id for course_id, _, _ in items})
+                     .values_list('id', flat=True))
+    module_ids = set(Module.objects.filter(id__in={module_id for _, module_id, _ in items if module_id})
+                     .values_list('id', flat=True))
+    course_rows, module_rows = [], []
+    for (course_id, module_id, bucket), views in items.items():
+        if course_id not in course_ids:
+            continue
+        if module_id is None:
+            course_rows.append((course_id, bucket, views))
+        elif module_id in module_ids:
+            module_rows.append((course_id, module_id, bucket, views))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for rows, with_module in ((course_rows, False), (module_rows, True)):
+                batch_size = max(1, min(500, (connection.features.max_query_params or 5000) // 4))
+                for i in range(0, len(rows), batch_size):
+                    batch = rows[i:i + batch_size]
+                    cursor.execute(_upsert_sql(len(batch), with_module),
+                                   [value for row in batch for value in row])
+
+
+views_buffer = WriteBehindBuffer(
+    flush_views,
+    merge=lambda old, new: old + new,
+    max_size=getattr(settings, 'COURSE_VIEWS_BUFFER_SIZE', 1000),
+    interval=getattr(settings, 'COURSE_VIEWS_FLUSH_INTERVAL', 30.0))
+
+
+def _object_id(obj):
+    return obj.id if isinstance(obj, (Course, Module)) else int(obj)
+
+
+def record_course_view(course, module=None):
+    # Просмотр увеличивает счетчик в памяти процесса; в базу попадает только сумма за интервал.
+    # Курс и модуль можно передать объектами или их ID.
+    bucket = bucket_for(timezone.now())
+    views_buffer.add((_object_id(course), _object_id(module) if module else None, bucket), 1)
+
+
+def recent_views_subquery(days=POPULAR_DAYS):
+    # Подзапрос с суммой просмотров страницы курса за последние days дней. Используется в annotate()
+    # для сортировки курсов по популярности и читает только сводную таблицу.
+    since = timezone.now() - timedelta(days=days)
+    views = CourseViewStat.objects.filter(course=OuterRef('pk'),
+                                          module__isnull=True,
+                                          bucket__gte=since)\
+        .order_by()\
+        .values('course')\
+        .annotate(total=Sum('views'))\
+        .values('total')
+    return Coalesce(Subquery(views, output_field=IntegerField()), 0)
+
+
+def order_by_popularity(queryset, days=POPULAR_DAYS):
+    return queryset.annotate(recent_views=recent_views_subquery(days))\
+        .order_by('-recent_views', '-created')
+
+
+def course_view_trend(course, days=POPULAR_DAYS):
+    # Просмотры страницы курса по интервалам: [(начало интервала, просмотры), ...].
+    since = timezone.now() - timedelta(days=days)
+    return list(CourseViewStat.objects.filter(course=course,
+                                              module__isnull=True,
+                                              bucket__gte=since)
+                .order_by('bucket')
+                .values_list('bucket', 'views'))
+
+
+def module_view_counts(course, days=POPULAR_DAYS):
+    # Суммарные просмотры модулей курса: {ID модуля: просмотры}.
+    since = timezone.now() - timedelta(days=days)
+    rows = CourseViewStat.objects.filter(course=course,
+                                         module__isnull=False,
+                                         bucket__gte=since)\
+        .order_by()\
+        .values('module')\
+        .annotate(total=Sum('views'))
+    return {row['module']: row['total'] for row in rows}
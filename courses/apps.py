@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CoursesConfig(AppConfig):
     name = 'courses'
+
+    def ready(self):
+        # Подключаем обработчики сигналов.
+        from . import signals  # noqa: F401
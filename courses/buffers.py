@@ -0,0 +1,102 @@
+import atexit
+import logging
+import threading
+import time
+from django.db import IntegrityError, connections
+
+logger = logging.getLogger(__name__)
+# Все созданные буферы; discard_buffers() очищает их (например, в конце прогона тестов).
+_buffers = []
+
+
+class WriteBehindBuffer(object):
+    # Буфер отложенной записи. События накапливаются в памяти процесса под ключами; повторное событие с тем же
+    # ключом объединяется с предыдущим функцией merge(). Накопленные данные передаются в flush_func() одним пакетом:
+    # в вызывающем потоке – только когда в буфере набирается max_size ключей, а раз в interval секунд – в фоновом
+    # потоке, чтобы запросы не выполняли запись по таймеру. При завершении процесса буфер сбрасывается через atexit.
+
+    def __init__(self, flush_func, merge=None, max_size=500, interval=10.0):
+        self.flush_func = flush_func
+        self.merge = merge or (lambda old, new: new)
+        self.max_size = max_size
+        self.interval = interval
+        self._items = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        self._thread = None
+        _buffers.append(self)
+        atexit.register(self.flush)
+
+    def __len__(self):
+        return len(self._items)
+
+    def add(self, key, value):
+        with self._lock:
+            if key in self._items:
+                self._items[key] = self.merge(self._items[key], value)
+            else:
+                self._items[key] = value
+            due = len(self._items) >= self.max_size
+        self._ensure_thread()
+        if due:
+            self.flush()
+
+    def flush(self):
+        # Забираем накопленные данные под блокировкой, а запись в базу выполняем вне ее,
+        # чтобы запросы не ждали окончания сброса.
+        with self._flush_lock:
+            with self._lock:
+                items, self._items = self._items, {}
+                self._last_flush = time.monotonic()
+            if not items:
+                return 0
+            try:
+                self.flush_func(items)
+            except IntegrityError:
+                # Повторная запись пакета, нарушающего ограничения базы, снова завершится ошибкой,
+                # поэтому такой пакет не возвращаем в буфер, а отбрасываем.
+                logger.exception('Dropped %d buffered entries that violate database constraints', len(items))
+                return 0
+            except Exception:
+                logger.exception('Failed to flush %d buffered entries', len(items))
+                # Возвращаем данные в буфер, чтобы записать их при следующем сбросе.
+                with self._lock:
+                    for key, value in items.items():
+                        if key in self._items:
+                            self._items[key] = self.merge(value, self._items[key])
+                        else:
+                            self._items[key] = value
+                return 0
+            return len(items)
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, daemon=True,
+                                            name='write-behind-buffer')
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            # Спим до истечения интервала с последнего сброса (он мог произойти в add() по размеру буфера).
+            remaining = self._last_flush + self.interval - time.monotonic()
+            if remaining > 0:
+                time.sleep(remaining)
+                continue
+            if not self._items:
+                self._last_flush = time.monotonic()
+                continue
+            self.flush()
+            # Соединения с базой, открытые фоновым потоком, закрываем сразу после сброса.
+            connections.close_all()
+
+
+def discard_buffers():
+    # Отбрасывает накопленные данные всех буферов без записи в базу.
+    for buffer in _buffers:
+        with buffer._lock:
+            buffer._items = {}
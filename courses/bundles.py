@@ -0,0 +1,258 @@
+import io
+import json
+import zipfile
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File as DjangoFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .models import Subject, Course, Module, Content, Text, File, Image, Video
+from .utils import bulk_create_returning
+
+BUNDLE_VERSION = 1
+RECORDS_NAME = 'course.jsonl'
+FILES_PREFIX = 'files/'
+
+# Поля, которые переносятся для каждого типа содержимого, кроме общих полей ItemBase.
+ITEM_FIELDS = {
+    'text': ['content'],
+    'file': ['file'],
+    'image': ['file'],
+    'video': ['url'],
+}
+ITEM_MODELS = {model._meta.model_name: model for model in (Text, File, Image, Video)}
+FILE_MODELS = ('file', 'image')
+
+
+class BundleError(Exception):
+    pass
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for obj in iterable:
+        chunk.append(obj)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _item_data(item):
+    data = {'title': item.title}
+    for field in ITEM_FIELDS[item._meta.model_name]:
+        value = getattr(item, field)
+        # У FileField сохраняем только имя файла в хранилище.
+        data[field] = value.name if hasattr(value, 'name') else value
+    return data
+
+
+def iter_course_records(course, chunk_size=500):
+    # Генератор записей выгрузки. Курс и модули выдаются сразу, а содержимое читается из базы пачками по chunk_size
+    # с помощью iterator(), поэтому расход памяти не зависит от размера курса. Для каждой пачки объекты Text, File,
+    # Image и Video получаем одним запросом in_bulk() на тип содержимого.
+    yield {'type': 'bundle', 'version': BUNDLE_VERSION}
+    yield {'type': 'course',
+           'data': {'title': course.title,
+                    'slug': course.slug,
+                    'overview': course.overview,
+                    'subject': {'slug': course.subject.slug,
+                                'title': course.subject.title}}}
+    for module in course.modules.all():
+        yield {'type': 'module', 'id': module.id,
+               'data': {'title': module.title,
+                        'description': module.description,
+                        'order': module.order}}
+    contents = Content.objects.filter(module__course=course)\
+        .select_related('content_type')\
+        .order_by('module__order', 'order')\
+        .iterator(chunk_size=chunk_size)
+    for chunk in _chunks(contents, chunk_size):
+        ids_by_type = defaultdict(list)
+        for content in chunk:
+            ids_by_type[content.content_type].append(content.object_id)
+        items = {}
+        for ct, ids in ids_by_type.items():
+            for pk, item in ct.model_class().objects.in_bulk(ids).items():
+                items[(ct.model, pk)] = item
+        for content in chunk:
+            item = items.get((content.content_type.model, content.object_id))
+            if item is None:
+                # Содержимое ссылается на удаленный объект – пропускаем его.
+                continue
+            yield {'type': 'item', 'model': content.content_type.model,
+                   'id': item.id, 'data': _item_data(item)}
+            yield {'type': 'content', 'module': content.module_id,
+                   'item': [content.content_type.model, item.id],
+                   'order': content.order}
+
+
+def iter_course_jsonl(course, chunk_size=500):
+    for record in iter_course_records(course, chunk_size=chunk_size):
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def iter_course_file_names(course):
+    # Второй проход по базе за именами файлов: так не нужно держать их в памяти, пока пишется course.jsonl.
+    for model_name in FILE_MODELS:
+        model = ITEM_MODELS[model_name]
+        ct = ContentType.objects.get_for_model(model)
+        object_ids = Content.objects.filter(module__course=course,
+                                            content_type=ct).values('object_id')
+        names = model.objects.filter(id__in=object_ids)\
+            .values_list('file', flat=True).iterator()
+        for name in names:
+            if name:
+                yield name
+
+
+def write_course_bundle(course, fileobj, chunk_size=500, include_files=True):
+    # Пишет zip-архив: записи в course.jsonl и прикрепленные файлы в каталоге files/. Файлы копируются потоком
+    # из хранилища, поэтому даже многогигабайтные курсы не загружаются в память целиком.
+    with zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        # force_zip64: размер course.jsonl заранее неизвестен и может превысить 2 ГБ.
+        with zf.open(RECORDS_NAME, 'w', force_zip64=True) as out:
+            for line in iter_course_jsonl(course, chunk_size=chunk_size):
+                out.write(line.encode('utf-8'))
+        if include_files:
+            for name in iter_course_file_names(course):
+                if not default_storage.exists(name):
+                    continue
+                with default_storage.open(name, 'rb') as src, \
+                        zf.open(FILES_PREFIX + name, 'w', force_zip64=True) as dst:
+                    for data in iter(lambda: src.read(1024 * 1024), b''):
+                        dst.write(data)
+
+
+class CourseImporter(object):
+    # Загружает записи выгрузки в базу. Модули, объекты содержимого и Content создаются через bulk_create пачками
+    # по batch_size. Значения OrderField берутся из выгрузки, поэтому pre_save() не выполняет запрос latest()
+    # для каждого объекта. Типы содержимого сопоставляются по имени модели, а не по ID ContentType,
+    # который в разных окружениях может отличаться.
+
+    def __init__(self, owner, slug=None, batch_size=500, archive=None):
+        self.owner = owner
+        self.slug = slug
+        self.batch_size = batch_size
+        self.archive = archive
+        self.course = None
+        self.module_ids = {}
+        self.pending_modules = []
+        self.item_ids = {}
+        self.pending_items = defaultdict(list)
+        self.pending_contents = []
+        self.content_types = {name: ContentType.objects.get_for_model(model)
+                              for name, model in ITEM_MODELS.items()}
+
+    def run(self, records):
+        with transaction.atomic():
+            for record in records:
+                handler = getattr(self, 'handle_{}'.format(record.get('type')), None)
+                if handler is None:
+                    raise BundleError('Unknown record type: {}'.format(record.get('type')))
+                handler(record)
+            self.flush()
+        if self.course is None:
+            raise BundleError('Bundle has no course record.')
+        return self.course
+
+    def handle_bundle(self, record):
+        if record.get('version') != BUNDLE_VERSION:
+            raise BundleError('Unsupported bundle version: {}'.format(record.get('version')))
+
+    def handle_course(self, record):
+        data = record['data']
+        subject, _ = Subject.objects.get_or_create(
+            slug=data['subject']['slug'],
+            defaults={'title': data['subject']['title']})
+        self.course = Course.objects.create(owner=self.owner,
+                                            subject=subject,
+                                            title=data['title'],
+                                            slug=self.slug or data['slug'],
+                                            overview=data['overview'])
+
+    def handle_module(self, record):
+        self.pending_modules.append((record['id'], Module(course=self.course, **record['data'])))
+
+    def handle_item(self, record):
+        model_name = record['model']
+        if model_name not in ITEM_MODELS:
+            raise BundleError('Unknown content model: {}'.format(model_name))
+        data = dict(record['data'])
+        if model_name in FILE_MODELS and data.get('file'):
+            data['file'] = self.import_file(data['file'])
+        item = ITEM_MODELS[model_name](owner=self.owner, **data)
+        self.pending_items[model_name].append((record['id'], item))
+
+    def handle_content(self, record):
+        self.pending_contents.append(record)
+        if len(self.pending_contents) >= self.batch_size:
+            self.flush()
+
+    def import_file(self, name):
+        # Если файлы лежат в архиве, сохраняем их в хранилище; иначе считаем, что хранилище общее
+        # и файл с таким именем уже доступен.
+        if self.archive is None:
+            return name
+        try:
+            src = self.archive.open(FILES_PREFIX + name)
+        except KeyError:
+            return name
+        with src:
+            try:
+                return default_storage.save(name, DjangoFile(src, name=name))
+            except SuspiciousFileOperation as e:
+                # Имя файла из архива указывает за пределы хранилища (например, содержит '..').
+                raise BundleError('Invalid file name in bundle: {} ({})'.format(name, e))
+
+    def flush(self):
+        if self.pending_modules:
+            created = bulk_create_returning(Module,
+                                            [module for _, module in self.pending_modules],
+                                            batch_size=self.batch_size)
+            for (old_id, _), module in zip(self.pending_modules, created):
+                self.module_ids[old_id] = module.id
+            self.pending_modules = []
+        for model_name, pending in self.pending_items.items():
+            created = bulk_create_returning(ITEM_MODELS[model_name],
+                                            [item for _, item in pending],
+                                            batch_size=self.batch_size)
+            for (old_id, _), item in zip(pending, created):
+                self.item_ids[(model_name, old_id)] = item.id
+        self.pending_items.clear()
+        contents = []
+        for record in self.pending_contents:
+            model_name, old_id = record['item']
+            contents.append(Content(module_id=self.module_ids[record['module']],
+                                    content_type=self.content_types[model_name],
+                                    # Каждый объект принадлежит одному Content, поэтому соответствие
+                                    # ID больше не нужно и его можно удалить.
+                                    object_id=self.item_ids.pop((model_name, old_id)),
+                                    order=record['order']))
+        Content.objects.bulk_create(contents, batch_size=self.batch_size)
+        self.pending_contents = []
+
+
+def iter_jsonl(lines):
+    for line in lines:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def import_course_bundle(fileobj, owner, slug=None, batch_size=500):
+    # Принимает zip-архив, созданный write_course_bundle(), или поток JSONL из iter_course_jsonl().
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as zf:
+            with zf.open(RECORDS_NAME) as raw:
+                lines = io.TextIOWrapper(raw, encoding='utf-8')
+                importer = CourseImporter(owner, slug=slug,
+                                          batch_size=batch_size, archive=zf)
+                return importer.run(iter_jsonl(lines))
+    fileobj.seek(0)
+    lines = io.TextIOWrapper(fileobj, encoding='utf-8')
+    importer = CourseImporter(owner, slug=slug, batch_size=batch_size)
+    return importer.run(iter_jsonl(lines))
@@ -0,0 +1,266 @@
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from django.core.cache import caches
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+INVALIDATION_SEQ_KEY = '__l1_invalidation_seq'
+INVALIDATION_MSG_KEY = '__l1_invalidation:{}'
+CLEAR_ALL = '*'
+_missing = object()
+
+
+class TwoTierCache(BaseCache):
+    # Двухуровневый кэш: небольшой LRU-кэш в памяти процесса (L1) поверх общего для всех процессов кэша (L2),
+    # например memcached. Чтение сначала проверяет L1, затем L2; запись идет в L2 и L1.
+    #
+    # В L2 вместе со значением хранится момент его истечения, поэтому запись, попавшая в L1 при чтении из L2,
+    # живет в L1 не дольше, чем в L2 (и не дольше L1_TIMEOUT секунд).
+    #
+    # Согласованность L1 между процессами поддерживается журналом инвалидации: при каждом изменении ключа
+    # процесс увеличивает счетчик INVALIDATION_SEQ_KEY в кэше SEQUENCE и записывает измененный ключ в L2 под номером
+    # счетчика. Не чаще раза в SYNC_INTERVAL секунд каждый процесс читает новые записи журнала и удаляет эти ключи
+    # из своего L1. Если записи журнала потеряны или их слишком много, L1 очищается целиком. Поэтому другие процессы
+    # видят изменение с задержкой до SYNC_INTERVAL секунд, а если два процесса получили один номер (incr не атомарен,
+    # например, в FileBasedCache), одна инвалидация теряется и значение устаревает до L1_TIMEOUT секунд.
+    # Для SEQUENCE стоит использовать кэш с атомарным incr (memcached, Redis). Ключи, для которых устаревание
+    # недопустимо (сессии, пользователи, права, счетчики), перечисляются в L1_EXCLUDE: они не попадают в L1
+    # и читаются и пишутся прямо в L2.
+    #
+    # Параметры OPTIONS:
+    #   SHARED – имя кэша L2 в CACHES (обязательный);
+    #   SEQUENCE – имя кэша для счетчика журнала инвалидации (по умолчанию SHARED);
+    #   L1_EXCLUDE – префиксы ключей, которые не кэшируются в L1;
+    #   L1_MAX_ENTRIES – максимальное число записей L1 (по умолчанию 1000);
+    #   L1_TIMEOUT – максимальное время жизни записи в L1, секунд (по умолчанию 60);
+    #   SYNC_INTERVAL – период проверки журнала инвалидации, секунд (по умолчанию 1).
+
+    def __init__(self, location, params):
+        options = dict(params.get('OPTIONS', {}))
+        self.shared_alias = options.pop('SHARED')
+        self.sequence_alias = options.pop('SEQUENCE', self.shared_alias)
+        self.l1_exclude = tuple(options.pop('L1_EXCLUDE', ()))
+        self.l1_max_entries = int(options.pop('L1_MAX_ENTRIES', 1000))
+        self.l1_timeout = float(options.pop('L1_TIMEOUT', 60))
+        self.sync_interval = float(options.pop('SYNC_INTERVAL', 1))
+        self.max_log_gap = int(options.pop('MAX_LOG_GAP', 500))
+        params = dict(params, OPTIONS=options)
+        super(TwoTierCache, self).__init__(params)
+        self._l1 = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_sync = 0
+        self._seen_seq = None
+        self._own_seqs = set()
+        self.stats = {'l1_hits': 0, 'l1_misses': 0, 'l2_hits': 0, 'l2_misses': 0,
+                      'invalidations': 0, 'l1_clears': 0}
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def sequence(self):
+        return caches[self.sequence_alias]
+
+    def _local(self, key):
+        # Кэшируется ли ключ в L1.
+        return not key.startswith(self.l1_exclude)
+
+    # L1
+
+    def _l1_get(self, key):
+        with self._lock:
+            entry = self._l1.get(key)
+            if entry is None:
+                return _missing
+            expires, data = entry
+            if expires < time.monotonic():
+                del self._l1[key]
+                return _missing
+            self._l1.move_to_end(key)
+        # Значения хранятся сериализованными, как в LocMemCache, чтобы вызывающий код не мог изменить их на месте.
+        return pickle.loads(data)
+
+    def _l1_set(self, key, value, expires):
+        # expires – момент истечения значения в L2 по time.time() или None, если значение бессрочное.
+        ttl = self.l1_timeout if expires is None else min(expires - time.time(), self.l1_timeout)
+        if ttl <= 0:
+            self._l1_delete(key)
+            return
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._l1[key] = (time.monotonic() + ttl, data)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self.l1_max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _l1_clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.stats['l1_clears'] += 1
+
+    # Журнал инвалидации
+
+    def _publish(self, key):
+        sequence = self.sequence
+        if sequence.add(INVALIDATION_SEQ_KEY, 1, None):
+            seq = 1
+        else:
+            try:
+                seq = sequence.incr(INVALIDATION_SEQ_KEY)
+            except ValueError:
+                sequence.set(INVALIDATION_SEQ_KEY, 1, None)
+                seq = 1
+        # Сообщение нужно хранить дольше, чем живут записи L1: после этого оно уже ничего не инвалидирует.
+        self.shared.set(INVALIDATION_MSG_KEY.format(seq), key, max(60, int(self.l1_timeout * 2)))
+        with self._lock:
+            self._own_seqs.add(seq)
+
+    def _sync(self):
+        now = time.monotonic()
+        if now - self._last_sync < self.sync_interval:
+            return
+        self._last_sync = now
+        seq = self.sequence.get(INVALIDATION_SEQ_KEY, 0)
+        with self._lock:
+            seen, self._seen_seq = self._seen_seq, seq
+            own, self._own_seqs = self._own_seqs, set()
+        if seen is None or seq == seen:
+            return
+        if seq < seen or seq - seen > self.max_log_gap:
+            # Общий кэш очищали или мы слишком отстали – надежнее очистить L1.
+            self._l1_clear()
+            return
+        numbers = [n for n in range(seen + 1, seq + 1) if n not in own]
+        messages = self.shared.get_many([INVALIDATION_MSG_KEY.format(n) for n in numbers])
+        if len(messages) < len(numbers):
+            self._l1_clear()
+            return
+        for key in messages.values():
+            if key == CLEAR_ALL:
+                self._l1_clear()
+                return
+            self._l1_delete(key)
+            self.stats['invalidations'] += 1
+
+    # Значения в L2
+
+    def _expires(self, timeout):
+        # Момент истечения по time.time() для значения, записанного с timeout; None – бессрочно.
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        return None if timeout is None else time.time() + timeout
+
+    def _shared_get(self, key, version):
+        entry = self.shared.get(key, _missing, version=version)
+        if not isinstance(entry, tuple) or len(entry) != 2:
+            # Нет значения или оно записано в L2 в обход TwoTierCache.
+            return _missing, None
+        return entry
+
+    # Интерфейс BaseCache
+
+    def get(self, key, default=None, version=None):
+        if not self._local(key):
+            return self.shared.get(key, default, version=version)
+        self._sync()
+        full_key = self.make_key(key, version=version)
+        self.validate_key(full_key)
+        value = self._l1_get(full_key)
+        if value is not _missing:
+            self.stats['l1_hits'] += 1
+            return value
+        self.stats['l1_misses'] += 1
+        value, expires = self._shared_get(key, version)
+        if value is _missing:
+            self.stats['l2_misses'] += 1
+            return default
+        self.stats['l2_hits'] += 1
+        self._l1_set(full_key, value, expires)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self.shared.set(key, value, timeout, version=version)
+        full_key = self.make_key(key, version=version)
+        self.validate_key(full_key)
+        expires = self._expires(timeout)
+        self.shared.set(key, (value, expires), timeout, version=version)
+        self._publish(full_key)
+        self._l1_set(full_key, value, expires)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self.shared.add(key, value, timeout, version=version)
+        full_key = self.make_key(key, version=version)
+        self.validate_key(full_key)
+        expires = self._expires(timeout)
+        added = self.shared.add(key, (value, expires), timeout, version=version)
+        if added:
+            self._publish(full_key)
+            self._l1_set(full_key, value, expires)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        if not self._local(key):
+            return self.shared.touch(key, timeout, version=version)
+        # Момент истечения хранится вместе со значением, поэтому значение перезаписывается.
+        value, _ = self._shared_get(key, version)
+        if value is _missing:
+            return False
+        self.set(key, value, timeout, version=version)
+        return True
+
+    def delete(self, key, version=None):
+        if not self._local(key):
+            return self.shared.delete(key, version=version)
+        full_key = self.make_key(key, version=version)
+        self.validate_key(full_key)
+        deleted = self.shared.delete(key, version=version)
+        self._publish(full_key)
+        self._l1_delete(full_key)
+        return deleted
+
+    def has_key(self, key, version=None):
+        if not self._local(key):
+            return self.shared.has_key(key, version=version)
+        return self.get(key, _missing, version=version) is not _missing
+
+    def incr(self, key, delta=1, version=None):
+        if not self._local(key):
+            return self.shared.incr(key, delta, version=version)
+        # Для ключей в L1 incr не атомарен; счетчики, которые меняют несколько процессов, нужно
+        # перечислить в L1_EXCLUDE.
+        value, expires = self._shared_get(key, version)
+        if value is _missing:
+            raise ValueError("Key '%s' not found" % key)
+        value += delta
+        timeout = None if expires is None else max(0.001, expires - time.time())
+        self.set(key, value, timeout, version=version)
+        return value
+
+    def clear(self):
+        self.shared.clear()
+        self._publish(CLEAR_ALL)
+        self._l1_clear()
+
+    def close(self, **kwargs):
+        # Общий кэш зарегистрирован в CACHES отдельно и закрывается сам. Обращение к caches[...] здесь создало бы его
+        # во время обхода caches.all() в обработчике request_finished.
+        pass
+
+    def get_stats(self):
+        # Статистика попаданий по уровням для текущего процесса.
+        stats = dict(self.stats)
+        with self._lock:
+            stats['l1_entries'] = len(self._l1)
+        l1_total = stats['l1_hits'] + stats['l1_misses']
+        l2_total = stats['l2_hits'] + stats['l2_misses']
+        stats['l1_hit_rate'] = stats['l1_hits'] / l1_total if l1_total else 0
+        stats['l2_hit_rate'] = stats['l2_hits'] / l2_total if l2_total else 0
+        return stats
@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+from django.http import Http404
+from .models import Subject
+
+SUBJECTS_VERSION_KEY = 'subjects:version'
+
+
+class LocalLRUCache(object):
+    # Небольшой кэш в памяти процесса: хранит не больше maxsize записей, вытесняя давно не использованные,
+    # и считает запись устаревшей через ttl секунд.
+
+    def __init__(self, maxsize=128, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class VersionedLocalCache(object):
+    # Локальный кэш, согласованный между процессами через номер версии в общем кэше Django. Записи хранятся
+    # под ключом (версия, ключ); чтобы сбросить кэш во всех процессах, достаточно увеличить версию.
+    # Общий кэш опрашивается не чаще раза в check_interval секунд.
+
+    def __init__(self, version_key, maxsize=128, ttl=300, check_interval=1.0):
+        self.version_key = version_key
+        self.check_interval = check_interval
+        self.local = LocalLRUCache(maxsize=maxsize, ttl=ttl)
+        self._version = None
+        self._checked = 0
+
+    def version(self):
+        now = time.monotonic()
+        if self._version is None or now - self._checked >= self.check_interval:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, 1, None)
+                version = cache.get(self.version_key, 1)
+            self._version, self._checked = version, now
+        return self._version
+
+    def get_or_set(self, key, func):
+        full_key = (self.version(), key)
+        value = self.local.get(full_key)
+        if value is None:
+            value = func()
+            self.local.set(full_key, value)
+        return value
+
+    def invalidate(self):
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 2, None)
+        # В текущем процессе изменения видны сразу, не дожидаясь следующей проверки версии.
+        self._version = None
+        self.local.clear()
+
+
+subjects_cache = VersionedLocalCache(
+    SUBJECTS_VERSION_KEY,
+    ttl=getattr(settings, 'SUBJECTS_CACHE_TTL', 3600),
+    check_interval=getattr(settings, 'SUBJECTS_CACHE_CHECK_INTERVAL', 1.0))
+
+
+def _load_subjects():
+    subjects = list(Subject.objects.annotate(total_courses=Count('courses')))
+    return subjects, {subject.slug: subject for subject in subjects}
+
+
+def get_subjects():
+    # Список предметов с количеством курсов для боковой панели. После первого запроса
+    # берется из памяти процесса, пока не изменится версия.
+    return subjects_cache.get_or_set('subjects', _load_subjects)[0]
+
+
+def get_subject_by_slug(slug):
+    # Замена get_object_or_404(Subject, slug=...), использующая тот же кэш.
+    subject = subjects_cache.get_or_set('subjects', _load_subjects)[1].get(slug)
+    if subject is None:
+        raise Http404('No Subject matches the given query.')
+    return subject
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from django.db import IntegrityError, transaction
+from .models import Course, Module, Content
+from .utils import bulk_create_returning
+
+
+SLUG_ATTEMPTS = 5
+
+
+def unique_course_slug(slug):
+    candidate = '{}-copy'.format(slug)
+    taken = set(Course.objects.filter(slug__startswith=candidate)
+                .values_list('slug', flat=True))
+    n = 2
+    while candidate in taken:
+        candidate = '{}-copy-{}'.format(slug, n)
+        n += 1
+    return candidate
+
+
+def create_course_copy(course, owner, title=None, slug=None):
+    # Свободный слаг выбирается до вставки, поэтому два одновременных копирования могут выбрать один и тот же.
+    # Проигравшая вставка нарушает уникальность Course.slug; ее откатываем до точки сохранения и берем
+    # следующий свободный слаг. Явно заданный слаг не меняем.
+    for attempt in range(SLUG_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                return Course.objects.create(owner=owner,
+                                             subject_id=course.subject_id,
+                                             title=title or course.title,
+                                             slug=slug or unique_course_slug(course.slug),
+                                             overview=course.overview)
+        except IntegrityError:
+            if slug or attempt == SLUG_ATTEMPTS - 1:
+                raise
+
+
+def clone_course(course, owner=None, title=None, slug=None):
+    # Полное копирование курса: модули, объекты Content и связанные объекты Text, File, Image и Video.
+    # Количество запросов не зависит от размера курса: одно чтение и один bulk_create на каждую модель.
+    # Значения order копируются, поэтому OrderField не запрашивает latest() для каждого объекта. Файлы не копируются:
+    # новые объекты File и Image ссылаются на те же файлы в хранилище.
+    owner = owner or course.owner
+    with transaction.atomic():
+        new_course = create_course_copy(course, owner, title, slug)
+
+        modules = list(Module.objects.filter(course=course))
+        old_module_ids = [m.id for m in modules]
+        for module in modules:
+            module.pk = None
+            module.course = new_course
+        modules = bulk_create_returning(Module, modules)
+        module_ids = dict(zip(old_module_ids, [m.id for m in modules]))
+
+        contents = list(Content.objects.filter(module__course=course)
+                        .select_related('content_type'))
+        ids_by_type = defaultdict(list)
+        for content in contents:
+            ids_by_type[content.content_type].append(content.object_id)
+
+        item_ids = {}
+        for ct, ids in ids_by_type.items():
+            model = ct.model_class()
+            items = list(model.objects.in_bulk(ids).values())
+            old_ids = [item.id for item in items]
+            for item in items:
+                item.pk = None
+                item.owner = owner
+            items = bulk_create_returning(model, items)
+            for old_id, item in zip(old_ids, items):
+                item_ids[(ct.id, old_id)] = item.id
+
+        new_contents = []
+        for content in contents:
+            object_id = item_ids.get((content.content_type_id, content.object_id))
+            if object_id is None:
+                # Содержимое ссылается на удаленный объект – не копируем его.
+                continue
+            new_contents.append(Content(module_id=module_ids[content.module_id],
+                                        content_type_id=content.content_type_id,
+                                        object_id=object_id,
+                                        order=content.order))
+        Content.objects.bulk_create(new_contents)
+    return new_course
@@ -1,10 +1,67 @@
 from django import forms
-from django.forms.models import inlineformset_factory
+from django.db import transaction
+from django.db.models import Max
+from django.forms.models import inlineformset_factory, BaseInlineFormSet
 from .models import Course, Module
 
 
+class BulkModuleFormSet(BaseInlineFormSet):
+    # Сохраняет набор форм модулей фиксированным числом запросов, вместо того чтобы сохранять каждую форму
+    # отдельно. Формы сравниваются с загруженными объектами: неизмененные пропускаются, измененные обновляются
+    # одним bulk_update(), новые создаются одним bulk_create(), отмеченные к удалению удаляются одним запросом.
+    # Порядок новым модулям назначается после одного запроса Max('order'), поэтому OrderField не выполняет
+    # latest() для каждого модуля.
+
+    def save(self, commit=True):
+        self.new_objects = []
+        self.changed_objects = []
+        self.deleted_objects = []
+        changed_fields = set()
+
+        for form in self.initial_forms:
+            obj = form.instance
+            if obj.pk is None:
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                self.deleted_objects.append(obj)
+            elif form.has_changed():
+                self.changed_objects.append((form.save(commit=False), form.changed_data))
+                changed_fields.update(form.changed_data)
+
+        for form in self.extra_forms:
+            if not form.has_changed():
+                continue
+            if self.can_delete and self._should_delete_form(form):
+                continue
+            obj = form.save(commit=False)
+            setattr(obj, self.fk.name, self.instance)
+            self.new_objects.append(obj)
+
+        if commit:
+            with transaction.atomic():
+                self.bulk_save(changed_fields)
+        return self.new_objects + [obj for obj, _ in self.changed_objects]
+
+    def bulk_save(self, changed_fields):
+        model = self.model
+        if self.deleted_objects:
+            model.objects.filter(**{self.fk.name: self.instance,
+                                    'pk__in': [obj.pk for obj in self.deleted_objects]}).delete()
+        if self.changed_objects:
+            model.objects.bulk_update([obj for obj, _ in self.changed_objects],
+                                      sorted(changed_fields))
+        if self.new_objects:
+            last = model.objects.filter(**{self.fk.name: self.instance})\
+                .aggregate(last=Max('order'))['last']
+            start = 0 if last is None else last + 1
+            for position, obj in enumerate(self.new_objects, start):
+                obj.order = position
+            model.objects.bulk_create(self.new_objects)
+
+
 ModuleFormSet = inlineformset_factory(Course,
                                       Module,
+                                      formset=BulkModuleFormSet,
                                       fields=['title', 'description'],
                                       extra=2,
                                       can_delete=True)
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.template.loader import render_to_string
+
+# Сколько объектов содержимого модуля отдается за один запрос и максимум, который может запросить страница.
+BATCH_SIZE = getattr(settings, 'CONTENT_BATCH_SIZE', 20)
+MAX_BATCH_SIZE = getattr(settings, 'CONTENT_MAX_BATCH_SIZE', 100)
+
+
+def parse_batch_params(params):
+    # Разбирает параметры ?after=<order>&limit=<n> запроса следующей пачки. Ошибка – ValueError.
+    after = params.get('after')
+    after = int(after) if after not in (None, '') else None
+    limit = int(params.get('limit') or BATCH_SIZE)
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    return after, min(limit, MAX_BATCH_SIZE)
+
+
+def content_batch(module, after=None, limit=BATCH_SIZE):
+    # Пачка содержимого модуля после курсора after (значение поля order) и курсор следующей пачки
+    # (None, если это последняя). Постраничная выборка идет по индексу (module, order), а объекты
+    # содержимого загружаются одним запросом на каждый тип через prefetch_related.
+    contents = module.contents.all()
+    if after is not None:
+        contents = contents.filter(order__gt=after)
+    contents = list(contents.prefetch_related('item')[:limit + 1])
+    next_cursor = None
+    if len(contents) > limit:
+        contents = contents[:limit]
+        next_cursor = contents[-1].order
+    return contents, next_cursor
+
+
+def iter_fragments(contents, template_name, request=None):
+    # HTML каждого объекта содержимого отдельной строкой, чтобы страницу можно было отдавать потоком.
+    for content in contents:
+        yield render_to_string(template_name, {'content': content}, request=request)
+
+
+def render_more_link(url, next_cursor):
+    return render_to_string('courses/content/more.html', {'url': url, 'next_cursor': next_cursor})
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from courses.models import Course
+from courses.outline import check_outline, rebuild_outline
+
+
+class Command(BaseCommand):
+    help = 'Compares the denormalized course outlines used by student pages with the course tables.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--course', type=int, action='append',
+                            help='ID of a course to check (can be repeated). All courses by default.')
+        parser.add_argument('--fix', action='store_true',
+                            help='Rebuild outlines that do not match the course tables.')
+        parser.add_argument('--build-missing', action='store_true',
+                            help='Build outlines for courses that do not have one yet.')
+
+    def handle(self, *args, **options):
+        courses = Course.objects.order_by('id')
+        if options['course']:
+            courses = courses.filter(id__in=options['course'])
+        checked = missing = inconsistent = 0
+        for course in courses.iterator():
+            problems = check_outline(course)
+            if problems is None:
+                missing += 1
+                if options['build_missing']:
+                    rebuild_outline(course)
+                continue
+            checked += 1
+            if not problems:
+                continue
+            inconsistent += 1
+            self.stdout.write('Course {} "{}":'.format(course.id, course))
+            for problem in problems:
+                self.stdout.write('  ' + problem)
+            if options['fix']:
+                rebuild_outline(course)
+                self.stdout.write('  rebuilt')
+        self.stdout.write('Checked {} outlines: {} inconsistent, {} courses without an outline{}.'.format(
+            checked, inconsistent, missing, ' (built)' if options['build_missing'] and missing else ''))
+        if inconsistent and not options['fix']:
+            raise CommandError('Found {} inconsistent outlines.'.format(inconsistent))
@@ -0,0 +1,38 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from courses.cloning import clone_course
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Copies a course with its modules and contents. Attached files are shared, not copied.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='Course slug or ID.')
+        parser.add_argument('--owner', help='Username of the new owner. Defaults to the current owner.')
+        parser.add_argument('--title', help='Title of the copy.')
+        parser.add_argument('--slug', help='Slug of the copy. Defaults to "<slug>-copy".')
+
+    def handle(self, *args, **options):
+        lookup = options['course']
+        try:
+            if lookup.isdigit():
+                course = Course.objects.get(id=lookup)
+            else:
+                course = Course.objects.get(slug=lookup)
+        except Course.DoesNotExist:
+            raise CommandError('Course "{}" does not exist.'.format(lookup))
+
+        owner = None
+        if options['owner']:
+            try:
+                owner = User.objects.get(username=options['owner'])
+            except User.DoesNotExist:
+                raise CommandError('User "{}" does not exist.'.format(options['owner']))
+        if options['slug'] and Course.objects.filter(slug=options['slug']).exists():
+            raise CommandError('Course with slug "{}" already exists.'.format(options['slug']))
+
+        new_course = clone_course(course, owner=owner,
+                                  title=options['title'], slug=options['slug'])
+        self.stdout.write(self.style.SUCCESS(
+            'Cloned course "{}" into "{}" (id={})'.format(course, new_course.slug, new_course.id)))
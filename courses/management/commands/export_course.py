@@ -0,0 +1,41 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from courses.bundles import write_course_bundle, iter_course_jsonl
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Exports a course with its modules, contents and files into a zip or JSONL bundle.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('course', help='Course slug or ID.')
+        parser.add_argument('output', help='Output path, or "-" to write JSONL to stdout.')
+        parser.add_argument('--jsonl', action='store_true',
+                            help='Write plain JSONL records without attached files.')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        lookup = options['course']
+        try:
+            if lookup.isdigit():
+                course = Course.objects.select_related('subject').get(id=lookup)
+            else:
+                course = Course.objects.select_related('subject').get(slug=lookup)
+        except Course.DoesNotExist:
+            raise CommandError('Course "{}" does not exist.'.format(lookup))
+
+        output = options['output']
+        if options['jsonl'] or output == '-':
+            stream = sys.stdout if output == '-' else open(output, 'w', encoding='utf-8')
+            try:
+                for line in iter_course_jsonl(course, chunk_size=options['chunk_size']):
+                    stream.write(line)
+            finally:
+                if stream is not sys.stdout:
+                    stream.close()
+        else:
+            with open(output, 'wb') as fileobj:
+                write_course_bundle(course, fileobj, chunk_size=options['chunk_size'])
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(
+                'Exported course "{}" to {}'.format(course, output)))
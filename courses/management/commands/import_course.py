@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from courses.bundles import import_course_bundle, BundleError
+from courses.models import Course
+
+
+class Command(BaseCommand):
+    help = 'Imports a course from a bundle created by export_course.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', help='Path to a zip or JSONL bundle.')
+        parser.add_argument('--owner', required=True,
+                            help='Username of the instructor who will own the course.')
+        parser.add_argument('--slug', help='Slug for the imported course, if it differs from the bundle.')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options['owner'])
+        except User.DoesNotExist:
+            raise CommandError('User "{}" does not exist.'.format(options['owner']))
+        slug = options['slug']
+        if slug and Course.objects.filter(slug=slug).exists():
+            raise CommandError('Course with slug "{}" already exists.'.format(slug))
+
+        with open(options['bundle'], 'rb') as fileobj:
+            try:
+                course = import_course_bundle(fileobj, owner, slug=slug,
+                                              batch_size=options['batch_size'])
+            except (BundleError, IntegrityError) as e:
+                raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            'Imported course "{}" (id={})'.format(course, course.id)))
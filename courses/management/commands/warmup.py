@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from courses.warmup import warm_up, measure_imports
+
+
+class Command(BaseCommand):
+    help = 'Precompiles templates, primes URL resolvers and the ContentType cache, and reports boot time.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-database', action='store_true',
+                            help='Skip steps that query the database.')
+        parser.add_argument('--imports', action='store_true',
+                            help='Report import time per top-level package in a fresh interpreter.')
+        parser.add_argument('--top', type=int, default=20)
+
+    def handle(self, *args, **options):
+        timings = warm_up(database=not options['no_database'])
+        for step, (seconds, result) in timings.items():
+            if step == 'templates':
+                compiled, errors = result
+                self.stdout.write('templates: {} compiled in {:.3f}s'.format(compiled, seconds))
+                for name, error in errors.items():
+                    self.stderr.write('  {}: {}'.format(name, error))
+            else:
+                self.stdout.write('{}: {} entries in {:.3f}s'.format(step, result, seconds))
+        if options['imports']:
+            self.stdout.write('import time by package:')
+            for package, ms in measure_imports(top=options['top']):
+                self.stdout.write('  {:<30} {:>9.1f} ms'.format(package, ms))
@@ -0,0 +1,80 @@
+import mimetypes
+import os
+import re
+from django.conf import settings
+from django.http import FileResponse, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.static import was_modified_since
+
+# Имена вида base.5e0f3f5b2a91.css создает ManifestStaticFilesStorage.
+HASHED_NAME_RE = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+DEFAULT_CACHE_CONTROL = 'public, max-age=300'
+# Порядок предпочтения сжатых вариантов.
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def accepted_encodings(header):
+    accepted = set()
+    for part in header.split(','):
+        token, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(token.strip().lower())
+    return accepted
+
+
+class PrecompressedStaticMiddleware(object):
+    # Отдает файлы из STATIC_ROOT, собранные CompressedManifestStaticFilesStorage. Если клиент принимает br или gzip
+    # и рядом с файлом есть сжатая копия, отдается она с заголовком Content-Encoding. Файлы с хешем в имени никогда
+    # не меняются, поэтому для них ставим Cache-Control: immutable на год. При DEBUG=True статику отдает
+    # runserver, и middleware ничего не делает.
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.static_url = settings.STATIC_URL
+        self.static_root = getattr(settings, 'STATIC_ROOT', None)
+
+    def __call__(self, request):
+        if (self.static_root and not settings.DEBUG and
+                request.method in ('GET', 'HEAD') and
+                request.path.startswith(self.static_url)):
+            response = self.serve(request, request.path[len(self.static_url):])
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def serve(self, request, name):
+        try:
+            path = safe_join(self.static_root, name)
+        except Exception:
+            return None
+        if not os.path.isfile(path):
+            return None
+
+        encoding, served_path = None, path
+        accepted = accepted_encodings(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        for candidate, suffix in ENCODINGS:
+            if candidate in accepted and os.path.isfile(path + suffix):
+                encoding, served_path = candidate, path + suffix
+                break
+
+        stat = os.stat(served_path)
+        if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'),
+                                  stat.st_mtime, stat.st_size):
+            response = HttpResponseNotModified()
+        else:
+            content_type, _ = mimetypes.guess_type(path)
+            response = FileResponse(open(served_path, 'rb'),
+                                    content_type=content_type or 'application/octet-stream')
+            response['Content-Length'] = stat.st_size
+            if encoding:
+                response['Content-Encoding'] = encoding
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Vary'] = 'Accept-Encoding'
+        if HASHED_NAME_RE.search(name):
+            response['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+        else:
+            response['Cache-Control'] = DEFAULT_CACHE_CONTROL
+        return response
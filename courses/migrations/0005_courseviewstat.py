@@ -0,0 +1,35 @@
+# Generated by Django 3.1 on 2026-10-19 09:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0004_course_students'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseViewStat',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=0)),
+                ('course', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='view_stats', to='courses.course')),
+                ('module', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='view_stats', to='courses.module')),
+            ],
+            options={
+                'ordering': ['-bucket'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='courseviewstat',
+            constraint=models.UniqueConstraint(condition=models.Q(module__isnull=True), fields=('course', 'bucket'), name='courseviewstat_course_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='courseviewstat',
+            constraint=models.UniqueConstraint(condition=models.Q(module__isnull=False), fields=('course', 'module', 'bucket'), name='courseviewstat_module_bucket'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 3.1 on 2026-10-19 09:09
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def renumber_duplicates(model, parent_field):
+    # Перед созданием уникальных ограничений убираем повторяющиеся значения order: в группах с дублями
+    # перенумеровываем объекты подряд, сохраняя текущий порядок (order, id).
+    groups = model.objects.values(parent_field)\
+        .annotate(total=Count('id'), distinct_orders=Count('order', distinct=True))\
+        .order_by()
+    for group in groups:
+        if group['total'] == group['distinct_orders']:
+            continue
+        objs = list(model.objects.filter(**{parent_field: group[parent_field]})
+                    .order_by('order', 'id'))
+        for position, obj in enumerate(objs):
+            obj.order = position
+        model.objects.bulk_update(objs, ['order'])
+
+
+def normalize_orders(apps, schema_editor):
+    renumber_duplicates(apps.get_model('courses', 'Module'), 'course')
+    renumber_duplicates(apps.get_model('courses', 'Content'), 'module')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0005_courseviewstat'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1 on 2026-10-19 09:09
+
+from django.db import migrations, models
+import django.db.models.constraints
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0006_normalize_orders'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='content',
+            index=models.Index(fields=['content_type', 'object_id'], name='content_item_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='content',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('module', 'order'), name='content_module_order_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='module',
+            constraint=models.UniqueConstraint(deferrable=django.db.models.constraints.Deferrable['DEFERRED'], fields=('course', 'order'), name='module_course_order_uniq'),
+        ),
+    ]
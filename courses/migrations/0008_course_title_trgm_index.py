@@ -0,0 +1,50 @@
+import warnings
+from django.db import DatabaseError, migrations, transaction
+
+CREATE_INDEX_SQL = ('CREATE INDEX IF NOT EXISTS course_title_trgm_idx '
+                    'ON courses_course USING gin (UPPER(title) gin_trgm_ops)')
+
+
+def create_trgm_index(apps, schema_editor):
+    # Поиск в админке (title__icontains) выполняется как UPPER(title) LIKE UPPER('%...%'). Обычный B-tree индекс
+    # такой запрос не ускоряет, поэтому создаем GIN-индекс по триграммам UPPER(title). Расширение pg_trgm есть
+    # только в PostgreSQL и может быть не установлено на сервере, а для его создания нужны права владельца базы.
+    # В таких случаях индекс не создается: поиск работает и без него, только медленнее.
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT installed_version FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        row = cursor.fetchone()
+    if row is None:
+        warnings.warn('PostgreSQL extension pg_trgm is not available; index course_title_trgm_idx '
+                      'is not created.')
+        return
+    if row[0] is None:
+        try:
+            # Ошибка внутри точки сохранения не прерывает транзакцию миграции.
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        except DatabaseError as e:
+            warnings.warn('Cannot create PostgreSQL extension pg_trgm ({}); index course_title_trgm_idx '
+                          'is not created. Run "CREATE EXTENSION pg_trgm" as a superuser and then '
+                          '"{}".'.format(str(e).strip(), CREATE_INDEX_SQL))
+            return
+    schema_editor.execute(CREATE_INDEX_SQL)
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS course_title_trgm_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0007_order_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 3.1 on 2026-10-19 14:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0008_course_title_trgm_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CourseOutline',
+            fields=[
+                ('course', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='outline', serialize=False, to='courses.course')),
+                ('data', models.JSONField(default=dict)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
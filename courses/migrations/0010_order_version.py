@@ -0,0 +1,23 @@
+# Generated by Django 3.1 on 2026-10-19 15:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('courses', '0009_courseoutline'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='course',
+            name='order_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='module',
+            name='order_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
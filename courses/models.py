@@ -30,6 +30,8 @@ class Course(models.Model):
     students = models.ManyToManyField(User,
                                       related_name='courses_joined',
                                       blank=True)
+    # Номер версии порядка модулей; увеличивается при каждом сохранении нового порядка (см. OrderView).
+    order_version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         ordering = ['-created']
@@ -44,6 +46,8 @@ class Module(models.Model):
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     order = OrderField(blank=True, for_fields=['course'])
+    # Номер версии порядка содержимого модуля (см. OrderView).
+    order_version = models.PositiveIntegerField(default=0, editable=False)
     # Новое поле называется order. Оно будет рассчитываться автоматически для каждого модуля в рамках одного курса,
     # т. к. мы указали for_fields=['course']. Таким образом, при создании нового
     # модуля его порядок будет больше на единицу, чем у предыдущего модуля курса.
@@ -54,6 +58,14 @@ class Module(models.Model):
     class Meta:
         ordering = ['order']
         # Теперь определим сортировку по умолчанию в классе Meta для моделей Module и Content:
+        # Модули всегда выбираются по курсу с сортировкой по order, поэтому нужен составной индекс (course, order).
+        # Его создает уникальное ограничение. Ограничение отложенное (DEFERRED): при смене порядка модулей внутри
+        # транзакции значения order временно совпадают, а проверка выполняется только при фиксации.
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'order'],
+                                    name='module_course_order_uniq',
+                                    deferrable=models.Deferrable.DEFERRED),
+        ]
 
 
 class Content(models.Model):
@@ -76,6 +88,17 @@ class Content(models.Model):
 
     class Meta:
         ordering = ['order']
+        # Уникальное ограничение (module, order) работает как составной индекс для выборки содержимого модуля,
+        # а индекс (content_type, object_id) – для обратного поиска Content по объекту содержимого.
+        constraints = [
+            models.UniqueConstraint(fields=['module', 'order'],
+                                    name='content_module_order_uniq',
+                                    deferrable=models.Deferrable.DEFERRED),
+        ]
+        indexes = [
+            models.Index(fields=['content_type', 'object_id'],
+                         name='content_item_idx'),
+        ]
 
 #     Это модель Content. Модуль курса может содержать множество объектов этого типа, поэтому мы используем ForeignKey
 # на модель Module. Также мы выполнили обобщенную связь, чтобы соединить объекты типа Content с любой другой моделью,
@@ -134,3 +157,46 @@ class Image(ItemBase):
 class Video(ItemBase):
     url = models.URLField()
     # Мы применили поле URLField, чтобы сохранять URL видео для его скачивания.
+
+
+class CourseViewStat(models.Model):
+    # Сводная статистика просмотров курса и его модулей по интервалам времени (bucket – начало интервала).
+    # Строки с module=None считают просмотры страницы курса, остальные – просмотры модулей. Таблица заполняется
+    # пакетно из буфера в courses/analytics.py, а не при каждом запросе.
+    course = models.ForeignKey(Course, related_name='view_stats',
+                               on_delete=models.CASCADE)
+    module = models.ForeignKey(Module, related_name='view_stats',
+                               null=True, blank=True,
+                               on_delete=models.CASCADE)
+    bucket = models.DateTimeField()
+    views = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-bucket']
+        constraints = [
+            models.UniqueConstraint(fields=['course', 'bucket'],
+                                    condition=models.Q(module__isnull=True),
+                                    name='courseviewstat_course_bucket'),
+            models.UniqueConstraint(fields=['course', 'module', 'bucket'],
+                                    condition=models.Q(module__isnull=False),
+                                    name='courseviewstat_module_bucket'),
+        ]
+
+    def __str__(self):
+        return '{} {}: {}'.format(self.course_id, self.bucket, self.views)
+
+
+class CourseOutline(models.Model):
+    # Денормализованная структура курса для страниц студента: модули, порядок содержимого и данные объектов
+    # содержимого в одном JSON-документе. Страница модуля читает эту строку вместо Course, Module, Content
+    # и таблиц объектов содержимого; HTML объектов показанной пачки берется из кэша (courses/outline.py).
+    # Документ обновляют обработчики редактирования курса, расхождение с основными таблицами проверяет
+    # команда check_outlines.
+    course = models.OneToOneField(Course, related_name='outline',
+                                  primary_key=True,
+                                  on_delete=models.CASCADE)
+    data = models.JSONField(default=dict)
+    updated = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return 'Outline of course {}'.format(self.course_id)
@@ -0,0 +1,180 @@
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .fragments import BATCH_SIZE
+from .models import Course, Content, CourseOutline
+
+# Версия структуры документа. Документы другой версии считаются устаревшими и пересобираются при чтении.
+OUTLINE_FORMAT = 2
+ITEM_HTML_KEY = 'item_html:{}:{}:{}'
+ITEM_HTML_TIMEOUT = getattr(settings, 'ITEM_HTML_CACHE_TIMEOUT', 24 * 3600)
+COURSE_FIELDS = ('id', 'title', 'slug', 'overview')
+MODULE_FIELDS = ('id', 'title', 'description', 'order')
+CONTENT_FIELDS = ('id', 'order', 'model', 'item_id', 'title', 'updated')
+
+
+def _content_entry(content):
+    item = content.item
+    return {'id': content.id,
+            'order': content.order,
+            'model': item._meta.model_name,
+            'item_id': item.id,
+            'title': item.title,
+            'updated': item.updated.isoformat()}
+
+
+def _module_entry(module, contents=None, previous=None):
+    entry = {field: getattr(module, field) for field in MODULE_FIELDS}
+    if contents is None:
+        # Содержимое модуля не менялось, обновляются только поля самого модуля.
+        entry['contents'] = previous['contents']
+        return entry
+    # Content без объекта содержимого (например, объект удалили через админку) не показываем.
+    entry['contents'] = [_content_entry(content) for content in contents if content.item is not None]
+    return entry
+
+
+def build_outline_data(course, previous=None, module_ids=None):
+    # Собирает документ курса: структуру и данные объектов содержимого без их HTML, поэтому документ
+    # остается небольшим даже для курсов с тысячами объектов. Если передан предыдущий документ previous,
+    # содержимое перечитывается только для модулей из module_ids и новых модулей.
+    # Без previous (или при module_ids=None) перечитывается содержимое всех модулей.
+    previous_modules = {m['id']: m for m in previous['modules']} if previous else {}
+    modules = list(course.modules.all())
+    reload_ids = {module.id for module in modules
+                  if module_ids is None or module.id in module_ids or module.id not in previous_modules}
+    contents = defaultdict(list)
+    if reload_ids:
+        # Объекты содержимого загружаются одним запросом на каждый тип.
+        for content in Content.objects.filter(module_id__in=reload_ids).prefetch_related('item'):
+            contents[content.module_id].append(content)
+    data = {field: getattr(course, field) for field in COURSE_FIELDS}
+    data['format'] = OUTLINE_FORMAT
+    data['modules'] = [_module_entry(module,
+                                     contents[module.id] if module.id in reload_ids else None,
+                                     previous_modules.get(module.id))
+                       for module in modules]
+    return data
+
+
+def rebuild_outline(course):
+    outline, _ = CourseOutline.objects.update_or_create(course=course,
+                                                        defaults={'data': build_outline_data(course)})
+    return outline
+
+
+def get_outline(course_id):
+    # Документ курса для страницы студента – один запрос. Если документа еще нет или он устарел,
+    # он собирается заново. Для несуществующего курса – Course.DoesNotExist.
+    outline = CourseOutline.objects.filter(course_id=course_id).first()
+    if outline is None or outline.data.get('format') != OUTLINE_FORMAT:
+        outline = rebuild_outline(Course.objects.get(id=course_id))
+    return outline
+
+
+def sync_outline(course, module_ids=()):
+    # Обновляет документ курса после изменений в обработчиках редактирования: поля курса и модулей,
+    # порядок модулей и содержимое модулей из module_ids. Строка блокируется на время обновления, чтобы
+    # одновременные изменения разных модулей не затирали друг друга. Если документа еще нет,
+    # он будет собран при первом чтении.
+    with transaction.atomic():
+        outline = CourseOutline.objects.select_for_update().filter(course=course).first()
+        if outline is None:
+            return None
+        if outline.data.get('format') == OUTLINE_FORMAT:
+            outline.data = build_outline_data(course, outline.data, set(module_ids))
+        else:
+            outline.data = build_outline_data(course)
+        outline.save()
+    return outline
+
+
+def find_module(data, module_id=None):
+    # Модуль документа по ID или первый модуль курса; None, если модуля нет.
+    modules = data['modules']
+    if module_id is None:
+        return modules[0] if modules else None
+    for module in modules:
+        if module['id'] == module_id:
+            return module
+    return None
+
+
+def outline_batch(module, after=None, limit=BATCH_SIZE):
+    # Пачка содержимого модуля из документа после курсора after – так же, как content_batch() для таблиц.
+    # К записям пачки добавляется HTML объектов (with_html).
+    contents = module['contents']
+    if after is not None:
+        contents = [content for content in contents if content['order'] > after]
+    next_cursor = contents[limit - 1]['order'] if len(contents) > limit else None
+    return with_html(contents[:limit]), next_cursor
+
+
+def item_html_key(entry):
+    # Время изменения объекта входит в ключ, поэтому после редактирования объекта старый HTML не используется.
+    return ITEM_HTML_KEY.format(entry['model'], entry['item_id'], entry['updated'])
+
+
+def with_html(contents):
+    # Копии записей документа с HTML объектов содержимого. HTML каждого объекта хранится в кэше отдельно:
+    # пачка читает его одним get_many(), а для отсутствующих объектов выполняется один запрос на тип
+    # и результат сохраняется в кэш.
+    keys = {content['id']: item_html_key(content) for content in contents}
+    cached = cache.get_many(list(keys.values()))
+    missing = defaultdict(list)
+    for content in contents:
+        if keys[content['id']] not in cached:
+            missing[content['model']].append(content)
+    rendered = {}
+    for model_name, entries in missing.items():
+        model = apps.get_model('courses', model_name)
+        items = model.objects.in_bulk([entry['item_id'] for entry in entries])
+        for entry in entries:
+            item = items.get(entry['item_id'])
+            if item is not None:
+                rendered[keys[entry['id']]] = str(item.render())
+    if rendered:
+        cache.set_many(rendered, ITEM_HTML_TIMEOUT)
+        cached.update(rendered)
+    return [dict(content, html=cached.get(keys[content['id']], '')) for content in contents]
+
+
+def _compare(kind, expected, actual, fields):
+    return ['{} {}: {} is {!r}, expected {!r}'.format(kind, expected['id'], field,
+                                                     actual.get(field), expected[field])
+            for field in fields if actual.get(field) != expected[field]]
+
+
+def check_outline(course):
+    # Сравнивает сохраненный документ курса с основными таблицами. Возвращает список расхождений;
+    # None, если документ еще не собирался.
+    outline = CourseOutline.objects.filter(course=course).first()
+    if outline is None:
+        return None
+    actual = outline.data
+    if actual.get('format') != OUTLINE_FORMAT:
+        return ['format is {!r}, expected {!r}'.format(actual.get('format'), OUTLINE_FORMAT)]
+    expected = build_outline_data(course)
+    problems = _compare('course', expected, actual, COURSE_FIELDS)
+    actual_modules = {m['id']: m for m in actual.get('modules', [])}
+    expected_ids = [m['id'] for m in expected['modules']]
+    if [m['id'] for m in actual.get('modules', [])] != expected_ids:
+        problems.append('modules are {}, expected {}'.format(list(actual_modules), expected_ids))
+    for module in expected['modules']:
+        actual_module = actual_modules.get(module['id'])
+        if actual_module is None:
+            continue
+        problems.extend(_compare('module', module, actual_module, MODULE_FIELDS))
+        actual_contents = {c['id']: c for c in actual_module.get('contents', [])}
+        expected_content_ids = [c['id'] for c in module['contents']]
+        if [c['id'] for c in actual_module.get('contents', [])] != expected_content_ids:
+            problems.append('module {}: contents are {}, expected {}'.format(
+                module['id'], list(actual_contents), expected_content_ids))
+        for content in module['contents']:
+            actual_content = actual_contents.get(content['id'])
+            if actual_content is None:
+                continue
+            problems.extend(_compare('content', content, actual_content, CONTENT_FIELDS))
+    return problems
@@ -0,0 +1,17 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .caching import subjects_cache
+from .models import Subject, Course
+
+
+@receiver(post_save, sender=Subject)
+@receiver(post_delete, sender=Subject)
+@receiver(post_save, sender=Course)
+@receiver(post_delete, sender=Course)
+def invalidate_subjects(sender, update_fields=None, **kwargs):
+    # Изменились предметы или количество курсов по предметам – сбрасываем кэш боковой панели во всех процессах.
+    # Сохранение курса только служебных полей (например, order_version при перестановке модулей)
+    # боковую панель не меняет.
+    if sender is Course and update_fields and not {'subject', 'title'} & set(update_fields):
+        return
+    subjects_cache.invalidate()
@@ -0,0 +1,59 @@
+import gzip
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.html', '.txt', '.json', '.xml', '.map')
+# Файлы меньше этого размера не сжимаем: выигрыш меньше накладных расходов на заголовки.
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    # Хранилище для collectstatic. ManifestStaticFilesStorage добавляет к именам файлов хеш содержимого
+    # (base.css -> base.5e0f3f5b2a91.css), а мы после этого сохраняем рядом сжатые копии .gz и, если установлен
+    # пакет brotli, .br. Сжатие выполняется один раз при сборке, а не на каждом запросе.
+    #
+    # Без collectstatic (тесты, локальный запуск с DEBUG=False) манифеста нет: такие файлы отдаются
+    # под исходными именами вместо ошибки ValueError на каждой странице.
+    manifest_strict = False
+
+    def stored_name(self, name):
+        try:
+            return super(CompressedManifestStaticFilesStorage, self).stored_name(name)
+        except ValueError:
+            # Файла нет и в STATIC_ROOT, поэтому хеш посчитать не из чего.
+            return name
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super(CompressedManifestStaticFilesStorage, self)\
+                .post_process(paths, dry_run=dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.add(name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        # Файл может обрабатываться в несколько проходов, поэтому итоговое имя берем из манифеста.
+        for name in sorted(names):
+            hashed_name = self.hashed_files.get(self.hash_key(self.clean_name(name)))
+            if hashed_name and hashed_name.endswith(COMPRESSIBLE_EXTENSIONS) and self.exists(hashed_name):
+                self.compress(hashed_name)
+
+    def compress(self, name):
+        with self.open(name) as f:
+            data = f.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = [('.gz', gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(data)))
+        for suffix, compressed in variants:
+            if len(compressed) >= len(data):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,16 @@
+from collections import defaultdict
+from django.contrib.contenttypes.models import ContentType
+from jobs.registry import job
+
+
+@job()
+def delete_items(items):
+    # Удаляет объекты Text, File, Image и Video, оставшиеся после удаления курса. Каскадное удаление по внешним
+    # ключам их не затрагивает, т. к. Content ссылается на них обобщенной связью. items – список пар
+    # (ID типа содержимого, ID объекта); удаление выполняется одним запросом на тип.
+    ids_by_type = defaultdict(list)
+    for content_type_id, object_id in items:
+        ids_by_type[content_type_id].append(object_id)
+    for content_type_id, ids in ids_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        model.objects.filter(id__in=ids).delete()
@@ -1,3 +1,542 @@
-from django.test import TestCase
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.contrib.auth.models import User, Permission
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .analytics import record_course_view, views_buffer
+from .buffers import discard_buffers
+from .bundles import BUNDLE_VERSION, FILES_PREFIX, RECORDS_NAME, import_course_bundle, iter_course_jsonl, \
+    write_course_bundle
+from .cache import TwoTierCache
+from .caching import subjects_cache
+from .cloning import clone_course, unique_course_slug
+from .forms import ModuleFormSet
+from .models import Subject, Course, Module, Content, Text, Image
+from .outline import check_outline, rebuild_outline
 
-# Create your tests here.
+ORDERED_TABLES = ('courses_module', 'courses_content')
+# Без collectstatic манифеста нет; тестам достаточно обычного хранилища статических файлов.
+TEST_STATIC_STORAGE = 'django.contrib.staticfiles.storage.StaticFilesStorage'
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'course-tests'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+               'LOCATION': 'course-tests-shared'},
+}
+
+
+def create_course_data(test_class, courses, modules_per_course, contents_per_module):
+    # Курсы с модулями и текстовым содержимым; объекты создаются пачками.
+    test_class.owner = User.objects.create_user('owner', password='owner')
+    test_class.owner.user_permissions.add(*Permission.objects.filter(codename__in=['add_course', 'change_course']))
+    test_class.student = User.objects.create_user('student', password='student')
+    subject = Subject.objects.create(title='Programming', slug='programming')
+    course_list = Course.objects.bulk_create([
+        Course(owner=test_class.owner, subject=subject, title='Course {}'.format(i),
+               slug='course-{}'.format(i), overview='')
+        for i in range(courses)])
+    if not connection.features.can_return_rows_from_bulk_insert:
+        course_list = list(Course.objects.order_by('id'))
+    Module.objects.bulk_create([
+        Module(course=course, title='Module {}'.format(i), order=i)
+        for course in course_list for i in range(modules_per_course)])
+    modules = list(Module.objects.order_by('course_id', 'order'))
+    Text.objects.bulk_create([
+        Text(owner=test_class.owner, title='Text {}'.format(i), content='text {}'.format(i))
+        for i in range(len(modules) * contents_per_module)])
+    texts = list(Text.objects.order_by('id'))
+    text_type = ContentType.objects.get_for_model(Text)
+    Content.objects.bulk_create([
+        Content(module=module, content_type=text_type,
+                object_id=texts[m * contents_per_module + i].id, order=i)
+        for m, module in enumerate(modules) for i in range(contents_per_module)])
+    test_class.course = course_list[courses // 2]
+    test_class.course.students.add(test_class.student)
+    test_class.module = test_class.course.modules.all()[modules_per_course // 2]
+
+
+def queried_tables(queries):
+    return {table for query in queries
+            for table in re.findall(r'FROM "(\w+)"', query['sql'])}
+
+
+@skipUnless(connection.vendor == 'postgresql', 'EXPLAIN checks need PostgreSQL.')
+@override_settings(STATICFILES_STORAGE=TEST_STATIC_STORAGE, CACHES=TEST_CACHES)
+class OrderedAccessIndexTests(TestCase):
+    # Проверяем по планам EXPLAIN, что запросы к модулям, содержимому и объектам содержимого, которые выполняют
+    # страницы студента и преподавателя, используют индексы, а не последовательное сканирование таблиц.
+    courses = 50
+    modules_per_course = 40
+    contents_per_module = 10
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, cls.courses, cls.modules_per_course, cls.contents_per_module)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def assert_index_scans(self, queries, tables=ORDERED_TABLES):
+        checked = 0
+        for query in queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or not any(t in sql for t in tables):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN ' + sql)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            for table in tables:
+                self.assertIsNone(re.search(r'Seq Scan on {}\b'.format(table), plan),
+                                  'Sequential scan in plan:\n{}\n{}'.format(sql, plan))
+            checked += 1
+        self.assertGreater(checked, 0)
+
+    def test_outline_build(self):
+        # Документ курса для страниц студента собирается из модулей и содержимого курса.
+        with CaptureQueriesContext(connection) as queries:
+            rebuild_outline(self.course)
+        self.assert_index_scans(queries)
+
+    def test_student_item_lookup(self):
+        # Страница студента читает документ курса, а для HTML пачки – объекты содержимого по первичному ключу.
+        rebuild_outline(self.course)
+        self.client.force_login(self.student)
+        url = reverse('student_module_contents', args=[self.course.id, self.module.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'after': 3, 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('courses_content', queried_tables(queries))
+        self.assert_index_scans(queries, tables=('courses_text',))
+
+    def test_manage_module_content_list(self):
+        self.client.force_login(self.owner)
+        url = reverse('module_content_list', args=[self.module.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assert_index_scans(queries)
+
+    def test_manage_module_content_batch(self):
+        self.client.force_login(self.owner)
+        url = reverse('module_content_batch', args=[self.module.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'after': 3, 'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assert_index_scans(queries)
+
+    def test_generic_item_lookup(self):
+        content = self.module.contents.first()
+        qs = Content.objects.filter(content_type_id=content.content_type_id,
+                                    object_id=content.object_id)
+        self.assertIn('content_item_idx', qs.explain())
+
+
+@override_settings(STATICFILES_STORAGE=TEST_STATIC_STORAGE, CACHES=TEST_CACHES)
+class StudentReadPathTests(TestCase):
+    # Страница модуля для студента и подгрузка следующих пачек читают только документ курса (CourseOutline)
+    # и, если HTML нет в кэше, объекты содержимого пачки – без запросов к модулям и Content.
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=2, modules_per_course=3, contents_per_module=30)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def read_page(self):
+        url = reverse('student_course_detail_module', args=[self.course.id, self.module.id])
+        response = self.client.get(url)
+        # Страница отдается потоком; содержимое пачки формируется при чтении ответа.
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_course_detail_reads_outline_only(self):
+        self.read_page()
+        with CaptureQueriesContext(connection) as queries:
+            response, html = self.read_page()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queried_tables(queries), {'courses_courseoutline'})
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(html.count('class="content-item"'), 20)
+        self.assertIn('data-next="19"', html)
+
+    def test_contents_batch(self):
+        # Первая страница кэширует пользователя, запись о зачислении и HTML первых 20 объектов.
+        self.read_page()
+        url = reverse('student_module_contents', args=[self.course.id, self.module.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {'after': 19})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queried_tables(queries), {'courses_courseoutline', 'courses_text'})
+        data = response.json()
+        self.assertIsNone(data['next'])
+        self.assertEqual(data['html'].count('class="content-item"'), 10)
+
+    def test_outline_follows_reorder(self):
+        rebuild_outline(self.course)
+        contents = list(self.module.contents.all())
+        order = {content.id: i for i, content in enumerate(reversed(contents))}
+        self.client.force_login(self.owner)
+        response = self.client.post(reverse('content_order'),
+                                    json.dumps({'parent': self.module.id,
+                                                'version': self.module.order_version,
+                                                'order': order}),
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(check_outline(self.course), [])
+        self.client.force_login(self.student)
+        _, html = self.read_page()
+        self.assertLess(html.index('<p>{}</p>'.format(contents[-1].item.content)),
+                        html.index('<p>{}</p>'.format(contents[-2].item.content)))
+
+    def test_not_enrolled(self):
+        other = User.objects.create_user('other')
+        self.client.force_login(other)
+        response = self.client.get(reverse('student_course_detail', args=[self.course.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(STATICFILES_STORAGE=TEST_STATIC_STORAGE, CACHES=TEST_CACHES)
+class OrderViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=3, contents_per_module=3)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.owner)
+        self.modules = list(self.course.modules.all())
+
+    def post_order(self, payload):
+        return self.client.post(reverse('module_order'), json.dumps(payload),
+                                content_type='application/json')
+
+    def module_orders(self):
+        return list(self.course.modules.values_list('id', 'order'))
+
+    def test_full_order(self):
+        order = {module.id: i for i, module in enumerate(reversed(self.modules))}
+        response = self.post_order({'parent': self.course.id, 'version': 0, 'order': order})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['version'], 1)
+        self.assertEqual(self.module_orders(), [(m.id, i) for i, m in enumerate(reversed(self.modules))])
+
+    def test_partial_order(self):
+        # Перестановка загруженной части списка: остальные объекты сохраняют свои позиции.
+        m0, m1, m2 = self.modules
+        response = self.post_order({m0.id: 1, m1.id: 0})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.module_orders(), [(m1.id, 0), (m0.id, 1), (m2.id, 2)])
+
+    def test_colliding_order(self):
+        m0, m1, m2 = self.modules
+        response = self.post_order({m0.id: 2, m1.id: 0})
+        self.assertEqual(response.status_code, 400)
+        response = self.post_order({'parent': self.course.id, 'order': {m0.id: 1, m1.id: 1, m2.id: 2}})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.module_orders(), [(m.id, m.order) for m in self.modules])
+
+    def test_foreign_object(self):
+        other = Module.objects.create(course=Course.objects.create(owner=self.owner, subject=self.course.subject,
+                                                                   title='Other', slug='other'),
+                                      title='Other', order=0)
+        response = self.post_order({'parent': self.course.id, 'order': {other.id: 5}})
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_version(self):
+        order = {module.id: i for i, module in enumerate(reversed(self.modules))}
+        self.assertEqual(self.post_order({'parent': self.course.id, 'version': 0, 'order': order}).status_code, 200)
+        response = self.post_order({'parent': self.course.id, 'version': 0, 'order': order})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['version'], 1)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SubjectsCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=2, contents_per_module=0)
+
+    def setUp(self):
+        cache.clear()
+        # Сбрасываем номер версии, запомненный процессом в предыдущих тестах.
+        subjects_cache.invalidate()
+
+    def test_course_changes_invalidate(self):
+        version = subjects_cache.version()
+        Course.objects.create(owner=self.owner, subject=self.course.subject, title='New', slug='new')
+        self.assertGreater(subjects_cache.version(), version)
+
+    def test_order_version_save_keeps_cache(self):
+        version = subjects_cache.version()
+        self.course.order_version += 1
+        self.course.save(update_fields=['order_version'])
+        self.assertEqual(subjects_cache.version(), version)
+
+
+@override_settings(STATICFILES_STORAGE=TEST_STATIC_STORAGE, CACHES=TEST_CACHES)
+class CourseStatsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=2, contents_per_module=0)
+
+    def setUp(self):
+        discard_buffers()
+
+    def tearDown(self):
+        discard_buffers()
+
+    def test_stats_page(self):
+        module = self.course.modules.last()
+        for _ in range(3):
+            record_course_view(self.course)
+        record_course_view(self.course, module)
+        views_buffer.flush()
+        self.client.force_login(self.owner)
+        response = self.client.get(reverse('course_stats', args=[self.course.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([views for _, views in response.context['trend']], [3])
+        self.assertEqual([(m.id, views) for m, views in response.context['modules']],
+                         [(m.id, 1 if m == module else 0) for m in self.course.modules.all()])
+
+    def test_other_owner(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('course_stats', args=[self.course.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class CourseBundleTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=2, contents_per_module=3)
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = self.settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        module = self.course.modules.first()
+        image = Image.objects.create(owner=self.owner, title='Picture',
+                                     file=ContentFile(b'image data', name='picture.png'))
+        Content.objects.create(module=module, item=image, order=3)
+
+    def course_items(self, course):
+        return [(content.module.title, content.order, content.content_type.model, content.item.title)
+                for content in Content.objects.filter(module__course=course)
+                .select_related('module', 'content_type').order_by('module__order', 'order')]
+
+    def test_jsonl_round_trip(self):
+        data = ''.join(iter_course_jsonl(self.course)).encode('utf-8')
+        course = import_course_bundle(io.BytesIO(data), self.student, slug='imported')
+        self.assertEqual(course.owner, self.student)
+        self.assertEqual(list(course.modules.values_list('title', 'order')),
+                         list(self.course.modules.values_list('title', 'order')))
+        self.assertEqual(self.course_items(course), self.course_items(self.course))
+        # Без архива файлы не копируются: новый объект ссылается на тот же файл хранилища.
+        image = Image.objects.get(title='Picture', owner=self.student)
+        self.assertEqual(image.file.name, Image.objects.get(owner=self.owner).file.name)
+
+    def test_zip_round_trip_copies_files(self):
+        bundle = io.BytesIO()
+        write_course_bundle(self.course, bundle)
+        original = Image.objects.get(owner=self.owner)
+        original.file.delete(save=False)
+        course = import_course_bundle(bundle, self.student, slug='imported')
+        self.assertEqual(self.course_items(course), self.course_items(self.course))
+        image = Image.objects.get(owner=self.student)
+        with image.file.open('rb') as f:
+            self.assertEqual(f.read(), b'image data')
+
+    def test_content_types_are_matched_by_model_name(self):
+        # ID объектов в выгрузке совпадают у разных типов, а ID типов содержимого в выгрузку не попадают.
+        records = [
+            {'type': 'bundle', 'version': BUNDLE_VERSION},
+            {'type': 'course', 'data': {'title': 'Remote', 'slug': 'remote', 'overview': '',
+                                        'subject': {'slug': 'remote', 'title': 'Remote'}}},
+            {'type': 'module', 'id': 1, 'data': {'title': 'Module', 'description': '', 'order': 0}},
+            {'type': 'item', 'model': 'text', 'id': 7, 'data': {'title': 'Text', 'content': 'text'}},
+            {'type': 'item', 'model': 'video', 'id': 7, 'data': {'title': 'Video', 'url': 'http://example.com/'}},
+            {'type': 'content', 'module': 1, 'item': ['video', 7], 'order': 0},
+            {'type': 'content', 'module': 1, 'item': ['text', 7], 'order': 1},
+        ]
+        data = '\n'.join(json.dumps(record) for record in records).encode('utf-8')
+        course = import_course_bundle(io.BytesIO(data), self.owner)
+        self.assertEqual(self.course_items(course), [('Module', 0, 'video', 'Video'), ('Module', 1, 'text', 'Text')])
+
+    def test_import_command_rejects_unsafe_file_names(self):
+        records = [
+            {'type': 'bundle', 'version': BUNDLE_VERSION},
+            {'type': 'course', 'data': {'title': 'Evil', 'slug': 'evil', 'overview': '',
+                                        'subject': {'slug': 'evil', 'title': 'Evil'}}},
+            {'type': 'item', 'model': 'file', 'id': 1, 'data': {'title': 'File', 'file': '../evil.txt'}},
+        ]
+        path = os.path.join(settings.MEDIA_ROOT, 'bundle.zip')
+        with zipfile.ZipFile(path, 'w') as zf:
+            zf.writestr(RECORDS_NAME, '\n'.join(json.dumps(record) for record in records))
+            zf.writestr(FILES_PREFIX + '../evil.txt', 'evil')
+        with self.assertRaises(CommandError):
+            call_command('import_course', path, owner=self.owner.username, stdout=io.StringIO())
+        self.assertFalse(Course.objects.filter(slug='evil').exists())
+
+
+class CourseCloneTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=2, contents_per_module=3)
+
+    def test_clone(self):
+        copy = clone_course(self.course, owner=self.student)
+        self.assertEqual(copy.slug, '{}-copy'.format(self.course.slug))
+        self.assertEqual((copy.owner, copy.title), (self.student, self.course.title))
+        self.assertEqual(list(copy.modules.values_list('title', 'order')),
+                         list(self.course.modules.values_list('title', 'order')))
+        original = list(Content.objects.filter(module__course=self.course).order_by('module__order', 'order'))
+        copied = list(Content.objects.filter(module__course=copy).order_by('module__order', 'order'))
+        self.assertEqual([(c.order, c.item.content) for c in copied], [(c.order, c.item.content) for c in original])
+        self.assertFalse({c.object_id for c in copied} & {c.object_id for c in original})
+        self.assertEqual({c.item.owner for c in copied}, {self.student})
+
+    def test_slug_suffix(self):
+        slugs = [clone_course(self.course).slug for _ in range(3)]
+        base = self.course.slug
+        self.assertEqual(slugs, [base + '-copy', base + '-copy-2', base + '-copy-3'])
+
+    def test_concurrent_slug(self):
+        # Другой процесс занял слаг между выбором и вставкой: берется следующий свободный.
+        taken = clone_course(self.course).slug
+        with mock.patch('courses.cloning.unique_course_slug',
+                        side_effect=[taken, unique_course_slug(self.course.slug)]):
+            copy = clone_course(self.course)
+        self.assertEqual(copy.slug, '{}-copy-2'.format(self.course.slug))
+
+    def test_explicit_slug_is_not_changed(self):
+        with self.assertRaises(IntegrityError):
+            clone_course(self.course, slug=self.course.slug)
+
+
+class ModuleFormSetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_course_data(cls, courses=1, modules_per_course=4, contents_per_module=0)
+
+    def make_formset(self, changes, new_titles):
+        modules = list(self.course.modules.all())
+        prefix = ModuleFormSet.get_default_prefix()
+        data = {'{}-TOTAL_FORMS'.format(prefix): len(modules) + 2,
+                '{}-INITIAL_FORMS'.format(prefix): len(modules),
+                '{}-MIN_NUM_FORMS'.format(prefix): 0,
+                '{}-MAX_NUM_FORMS'.format(prefix): 1000}
+        for i, module in enumerate(modules):
+            form_data = {'id': module.id, 'course': self.course.id,
+                         'title': module.title, 'description': module.description}
+            form_data.update(changes.get(i, {}))
+            data.update({'{}-{}-{}'.format(prefix, i, key): value for key, value in form_data.items()})
+        for i, title in enumerate(new_titles, len(modules)):
+            data['{}-{}-title'.format(prefix, i)] = title
+        formset = ModuleFormSet(instance=self.course, data=data)
+        self.assertTrue(formset.is_valid(), formset.errors)
+        return formset
+
+    def test_save(self):
+        formset = self.make_formset({1: {'title': 'Renamed'}, 2: {'DELETE': 'on'}}, ['New 1', 'New 2'])
+        # Удаление (выборка удаляемых модулей и их Content, DELETE для каждой таблицы), bulk_update(),
+        # Max('order') и bulk_create(); плюс точка сохранения transaction.atomic().
+        with CaptureQueriesContext(connection) as queries:
+            formset.save()
+        self.assertEqual(list(self.course.modules.values_list('title', 'order')),
+                         [('Module 0', 0), ('Renamed', 1), ('Module 3', 3), ('New 1', 4), ('New 2', 5)])
+        count = len(queries)
+        # Число запросов не зависит от числа измененных и новых модулей.
+        formset = self.make_formset({0: {'title': 'A'}, 1: {'title': 'B'}, 2: {'DELETE': 'on'},
+                                     3: {'DELETE': 'on'}}, ['New 3'])
+        with self.assertNumQueries(count):
+            formset.save()
+        self.assertEqual(list(self.course.modules.values_list('title', 'order')),
+                         [('A', 0), ('B', 1), ('New 2', 5), ('New 3', 6)])
+
+    def test_unchanged_forms_are_not_saved(self):
+        formset = self.make_formset({}, [])
+        with self.assertNumQueries(2):
+            # Только SAVEPOINT и RELEASE SAVEPOINT.
+            formset.save()
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+               'LOCATION': 'two-tier-tests'},
+})
+class TwoTierCacheTests(SimpleTestCase):
+    # Два экземпляра TwoTierCache над одним L2 ведут себя как кэши двух рабочих процессов.
+
+    def make_cache(self):
+        return TwoTierCache('', {'OPTIONS': {'SHARED': 'shared',
+                                             'L1_EXCLUDE': ['auth_user:'],
+                                             'L1_TIMEOUT': 60,
+                                             'SYNC_INTERVAL': 0}})
+
+    def setUp(self):
+        self.first = self.make_cache()
+        self.second = self.make_cache()
+        self.first.clear()
+        # Оба экземпляра запоминают текущий номер журнала инвалидации.
+        self.first.get('sync')
+        self.second.get('sync')
+
+    def test_set_is_visible_in_other_process(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get_stats()['l2_hits'], 1)
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get_stats()['l1_hits'], 1)
+
+    def test_update_invalidates_other_l1(self):
+        self.first.set('key', 'old')
+        self.assertEqual(self.second.get('key'), 'old')
+        self.first.set('key', 'new')
+        self.assertEqual(self.second.get('key'), 'new')
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_l1_respects_l2_expiry(self):
+        self.first.set('key', 'value', 0.2)
+        self.assertEqual(self.second.get('key'), 'value')
+        time.sleep(0.3)
+        self.assertIsNone(self.first.get('key'))
+        self.assertIsNone(self.second.get('key'))
+
+    def test_excluded_keys_bypass_l1(self):
+        self.first.set('auth_user:1', 'alice')
+        self.assertEqual(self.second.get('auth_user:1'), 'alice')
+        # Значение, измененное в L2 напрямую, сразу видно: локальной копии нет.
+        self.first.shared.set('auth_user:1', 'bob')
+        self.assertEqual(self.second.get('auth_user:1'), 'bob')
+        self.assertEqual(self.second.get_stats()['l1_entries'], 0)
+
+    def test_incr_keeps_expiry(self):
+        self.first.set('counter', 1, 0.2)
+        self.assertEqual(self.first.incr('counter'), 2)
+        self.assertEqual(self.second.get('counter'), 2)
+        time.sleep(0.3)
+        self.assertIsNone(self.second.get('counter'))
@@ -0,0 +1,22 @@
+import time
+from django.conf import settings
+from django.core.cache import cache
+
+THROTTLE_KEY = 'throttle:{}:{}'
+
+
+def allow_request(user_id, scope, rate=None, burst=None):
+    # Ограничение частоты запросов по алгоритму "ведро с токенами": токены пополняются со скоростью rate в секунду,
+    # в ведре помещается не больше burst. Состояние хранится в общем кэше, поэтому ограничение действует
+    # во всех рабочих процессах. Возвращает (разрешено, через сколько секунд повторить).
+    rate = rate or getattr(settings, 'REORDER_RATE', 2.0)
+    burst = burst or getattr(settings, 'REORDER_BURST', 5)
+    key = THROTTLE_KEY.format(scope, user_id)
+    now = time.time()
+    tokens, updated = cache.get(key, (burst, now))
+    tokens = min(burst, tokens + (now - updated) * rate)
+    if tokens < 1:
+        cache.set(key, (tokens, now), int(burst / rate) + 1)
+        return False, (1 - tokens) / rate
+    cache.set(key, (tokens - 1, now), int(burst / rate) + 1)
+    return True, 0
@@ -7,6 +7,9 @@ urlpatterns = [
     path('create/', views.CourseCreateView.as_view(), name='course_create'),
     path('<pk>/edit/', views.CourseUpdateView.as_view(), name='course_edit'),
     path('<pk>/delete/', views.CourseDeleteView.as_view(), name='course_delete'),
+    path('<pk>/export/', views.CourseExportView.as_view(), name='course_export'),
+    path('<pk>/clone/', views.CourseCloneView.as_view(), name='course_clone'),
+    path('<pk>/stats/', views.CourseStatsView.as_view(), name='course_stats'),
     path('<pk>/module/', views.CourseModuleUpdateView.as_view(),
          name='course_module_update'),
     path('module/<int:module_id>/content/<model_name>/create/',
@@ -17,8 +20,11 @@ urlpatterns = [
          name='module_content_delete'),
     path('module/<int:module_id>/',views.ModuleContentListView.as_view(),
          name='module_content_list'),
+    path('module/<int:module_id>/contents/', views.ModuleContentBatchView.as_view(),
+         name='module_content_batch'),
     path('module/order/', views.ModuleOrderView.as_view(), name='module_order'),
     path('content/order/', views.ContentOrderView.as_view(), name='content_order'),
+    path('cache-stats/', views.CacheStatsView.as_view(), name='cache_stats'),
     path('subject/<slug:subject>)/', views.CourseListView.as_view(),
          name='course_list_subject'),
     path('<slug:slug>/', views.CourseDetailView.as_view(),
@@ -0,0 +1,13 @@
+from django.db import connection
+
+
+def bulk_create_returning(model, objs, batch_size=None):
+    # Создает объекты одним запросом на пачку и возвращает их с заполненными первичными ключами. PostgreSQL возвращает
+    # ID из bulk_create(); на базах, которые этого не умеют (SQLite в Django 3.1), сохраняем объекты по одному,
+    # чтобы вызывающий код мог построить соответствие старых и новых ID.
+    objs = list(objs)
+    if connection.features.can_return_rows_from_bulk_insert:
+        return model.objects.bulk_create(objs, batch_size=batch_size)
+    for obj in objs:
+        obj.save(force_insert=True)
+    return objs
@@ -11,10 +11,23 @@ from .forms import ModuleFormSet
 from django.forms.models import modelform_factory
 from django.apps import apps
 from .models import Module, Content
-from braces.views import CsrfExemptMixin, JsonRequestResponseMixin
+from braces.views import CsrfExemptMixin, JsonRequestResponseMixin, JSONResponseMixin, StaffuserRequiredMixin
 from django.db.models import Count
-from .models import Subject
 from students.forms import CourseEnrollForm
+from students.enrollment import is_enrolled
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.conf import settings
+from django.core.cache import caches
+from .bundles import iter_course_jsonl
+from .cloning import clone_course
+from .analytics import record_course_view, order_by_popularity, recent_views_subquery, course_view_trend, \
+    module_view_counts, POPULAR_DAYS
+from .caching import get_subjects, get_subject_by_slug
+from .tasks import delete_items
+from .throttling import allow_request
+from .fragments import parse_batch_params, content_batch, iter_fragments
+from .outline import sync_outline
 
 
 class OwnerMixin(object):
@@ -62,6 +75,11 @@ class OwnerCourseEditMixin(OwnerCourseMixin, OwnerEditMixin):
 class ManageCourseListView(OwnerCourseMixin, ListView):  # список курсов, созданных пользователем
     template_name = 'courses/manage/course/list.html'
 
+    def get_queryset(self):
+        # Количество просмотров за последние дни берется из сводной таблицы статистики.
+        qs = super(ManageCourseListView, self).get_queryset()
+        return qs.annotate(recent_views=recent_views_subquery())
+
 
 class CourseCreateView(PermissionRequiredMixin, OwnerCourseEditMixin,
                        CreateView):  # использует модельную форму для создания нового курса.
@@ -75,6 +93,12 @@ class CourseUpdateView(PermissionRequiredMixin, OwnerCourseEditMixin,
                        UpdateView):  # позволяет владельцу курса редактировать его
     permission_required = 'courses.change_course'
 
+    def form_valid(self, form):
+        response = super(CourseUpdateView, self).form_valid(form)
+        # Название и описание курса хранятся и в документе для студентов (courses/outline.py).
+        sync_outline(self.object)
+        return response
+
 
 class CourseDeleteView(PermissionRequiredMixin, OwnerCourseMixin,
                        DeleteView):  # Задает атрибут success_url – адрес, на который пользователь
@@ -83,6 +107,57 @@ class CourseDeleteView(PermissionRequiredMixin, OwnerCourseMixin,
     success_url = reverse_lazy('manage_course_list')
     permission_required = 'courses.delete_course'
 
+    def delete(self, request, *args, **kwargs):
+        # Модули и Content удаляются каскадно вместе с курсом, а объекты содержимого удаляет фоновая задача,
+        # чтобы запрос не ждал удаления тысяч строк.
+        items = list(Content.objects.filter(module__course__id=kwargs['pk'],
+                                            module__course__owner=request.user)
+                     .values_list('content_type_id', 'object_id'))
+        response = super(CourseDeleteView, self).delete(request, *args, **kwargs)
+        if items:
+            delete_items.delay(items)
+        return response
+
+
+class CourseExportView(LoginRequiredMixin, View):
+    # Отдает выгрузку курса в формате JSONL потоком: записи формируются генератором iter_course_jsonl() по мере
+    # отправки ответа, поэтому курс любого размера не собирается в памяти целиком.
+    def get(self, request, pk):
+        course = get_object_or_404(Course.objects.select_related('subject'),
+                                   id=pk,
+                                   owner=request.user)
+        response = StreamingHttpResponse(iter_course_jsonl(course),
+                                         content_type='application/x-ndjson')
+        response['Content-Disposition'] = 'attachment; filename="{}.jsonl"'.format(course.slug)
+        return response
+
+
+class CourseStatsView(TemplateResponseMixin, LoginRequiredMixin, View):
+    # Статистика просмотров курса для преподавателя: просмотры страницы курса по интервалам и суммарные
+    # просмотры каждого модуля. Данные читаются только из сводной таблицы (courses/analytics.py).
+    template_name = 'courses/manage/course/stats.html'
+
+    def get(self, request, pk):
+        course = get_object_or_404(Course, id=pk, owner=request.user)
+        module_views = module_view_counts(course)
+        modules = [(module, module_views.get(module.id, 0))
+                   for module in course.modules.only('id', 'title', 'order')]
+        return self.render_to_response({'course': course,
+                                        'days': POPULAR_DAYS,
+                                        'trend': course_view_trend(course),
+                                        'modules': modules})
+
+
+class CourseCloneView(PermissionRequiredMixin, LoginRequiredMixin, View):
+    # Создает копию курса для нового набора студентов и открывает форму редактирования копии,
+    # чтобы преподаватель сразу мог поменять название и слаг.
+    permission_required = 'courses.add_course'
+
+    def post(self, request, pk):
+        course = get_object_or_404(Course, id=pk, owner=request.user)
+        new_course = clone_course(course, owner=request.user)
+        return redirect('course_edit', new_course.id)
+
 
 class CourseModuleUpdateView(TemplateResponseMixin, View):
     template_name = 'courses/manage/module/formset.html'
@@ -106,6 +181,8 @@ class CourseModuleUpdateView(TemplateResponseMixin, View):
         formset = self.get_formset(data=request.POST)
         if formset.is_valid():
             formset.save()
+            # Новые модули добавляются в документ курса, удаленные – убираются из него.
+            sync_outline(self.course)
             return redirect('manage_course_list')
         return self.render_to_response({'course': self.course,
                                         'formset': formset})
@@ -191,6 +268,7 @@ class ContentCreateUpdateView(TemplateResponseMixin, View):
             if not id:
                 # Создаем новый объект.
                 Content.objects.create(module=self.module, item=obj)
+            sync_outline(self.module.course, [self.module.id])
             return redirect('module_content_list', self.module.id)
         return self.render_to_response({'form': form, 'object': self.obj})
 
@@ -203,6 +281,7 @@ class ContentDeleteView(View):
         module = content.module
         content.item.delete()
         content.delete()
+        sync_outline(module.course, [module.id])
         return redirect('module_content_list', module.id)
 # Обработчик ContentDeleteView получает объект типа Content по переданному ID и удаляет соответствующий объект модели
 # Text, Video, Image или File, после чего ликвидирует объект Content. При успешном завершении действия перенаправляет
@@ -218,25 +297,142 @@ class ModuleContentListView(TemplateResponseMixin, View):
         module = get_object_or_404(Module,
                                    id=module_id,
                                    course__owner=request.user)
-        return self.render_to_response({'module': module})
-
+        # На странице сразу показывается только первая пачка содержимого, остальное подгружается
+        # через ModuleContentBatchView по мере прокрутки.
+        contents, next_cursor = content_batch(module)
+        # Текущие версии порядка нужны странице для запросов на сохранение порядка (см. OrderView).
+        return self.render_to_response({'module': module,
+                                        'contents': contents,
+                                        'next_cursor': next_cursor,
+                                        'modules_version': module.course.order_version,
+                                        'contents_version': module.order_version})
+
+
+class ModuleContentBatchView(JSONResponseMixin, View):
+    # Следующая пачка содержимого модуля для страницы ModuleContentListView:
+    #   GET ?after=<order последнего показанного объекта>&limit=<n>
+    #   -> {"html": HTML пачки, "next": курсор следующей пачки или null}
+    def get(self, request, module_id):
+        module = get_object_or_404(Module,
+                                   id=module_id,
+                                   course__owner=request.user)
+        try:
+            after, limit = parse_batch_params(request.GET)
+        except ValueError:
+            return self.render_json_response({'error': 'Invalid cursor.'}, status=400)
+        contents, next_cursor = content_batch(module, after, limit)
+        html = ''.join(iter_fragments(contents, 'courses/manage/module/content_item.html', request))
+        return self.render_json_response({'html': html, 'next': next_cursor})
+
+
+class OrderView(CsrfExemptMixin, JsonRequestResponseMixin, View):
+    # Общий обработчик сохранения порядка после перетаскивания. Запрос содержит полный новый порядок:
+    #   {"parent": ID курса или модуля, "version": номер версии, "order": {ID: порядок, ...}}
+    # Старый формат {ID: порядок, ...} без версии тоже принимается.
+    #   - частота запросов ограничена для каждого пользователя (courses/throttling.py); при превышении отвечаем 429
+    #   с Retry-After, и страница повторяет запрос с последним порядком;
+    #   - версия порядка хранится в строке родителя (поле order_version). Строка блокируется на время сравнения
+    #   версии и записи, поэтому из двух одновременных запросов с одной версией пройдет только первый.
+    #   Если порядок уже изменил более поздний запрос, отвечаем 409 с текущей версией, и страница отправляет
+    #   свое последнее состояние заново (побеждает последняя запись);
+    #   - порядок может содержать только объекты родителя, и итоговые позиции всех объектов родителя
+    #   должны различаться, иначе отвечаем 400;
+    #   - записываются только объекты, у которых порядок действительно изменился, одним bulk_update().
+    # Подклассы задают:
+    #   model – модель упорядочиваемых объектов, parent_field – поле связи с родителем;
+    #   parent_model – модель родителя, owner_lookup – путь от родителя к владельцу курса;
+    #   course_field – путь от родителя к курсу (None, если родитель – сам курс) для обновления документа курса.
+    model = None
+    parent_field = None
+    parent_model = None
+    owner_lookup = None
+    course_field = None
 
-class ModuleOrderView(CsrfExemptMixin, JsonRequestResponseMixin, View):
-    # Нам нужен обработчик, который будет получать новый порядок модулей курса в формате JSON
     def post(self, request):
-        for id, order in self.request_json.items():
-            Module.objects.filter(id=id,
-                                  course__owner=request.user).update(order=order)
-        return self.render_json_response({'saved': 'OK'})
+        payload = self.request_json
+        if not isinstance(payload, dict):
+            return self.render_bad_request_response()
+        if 'order' in payload:
+            order, version, parent_id = payload['order'], payload.get('version'), payload.get('parent')
+        else:
+            order, version, parent_id = payload, None, None
+        try:
+            order = {int(id): int(position) for id, position in order.items()}
+            version = int(version) if version is not None else None
+            parent_id = int(parent_id) if parent_id is not None else None
+        except (AttributeError, TypeError, ValueError):
+            return self.render_bad_request_response()
+        if not order:
+            return self.render_json_response({'saved': 'OK'})
+        if parent_id is None:
+            parent_id = self.model.objects.filter(id__in=list(order))\
+                .values_list(self.parent_field + '_id', flat=True).first()
+
+        allowed, retry_after = allow_request(request.user.id, 'reorder')
+        if not allowed:
+            response = self.render_json_response({'throttled': True,
+                                                  'retry_after': retry_after}, status=429)
+            response['Retry-After'] = max(1, int(round(retry_after)))
+            return response
+
+        # Уникальность (родитель, order) проверяется при фиксации транзакции,
+        # поэтому промежуточные совпадения order при перестановке допустимы.
+        with transaction.atomic():
+            parent = get_object_or_404(self.parent_model.objects.select_for_update(of=('self',)),
+                                       **{'id': parent_id, self.owner_lookup: request.user})
+            if version is not None and version != parent.order_version:
+                return self.render_json_response({'stale': True,
+                                                  'version': parent.order_version}, status=409)
+            objs = list(self.model.objects.filter(**{self.parent_field: parent}).only('id', 'order'))
+            # Страница со списком содержимого отправляет только загруженные пачки, поэтому порядок может
+            # содержать не все объекты родителя. Итоговые позиции всех объектов должны различаться,
+            # иначе уникальность (родитель, order) нарушится при фиксации транзакции.
+            positions = {obj.id: order.get(obj.id, obj.order) for obj in objs}
+            if not set(order) <= set(positions) or len(set(positions.values())) != len(positions):
+                return self.render_bad_request_response()
+            changed = [obj for obj in objs if obj.order != positions[obj.id]]
+            for obj in changed:
+                obj.order = positions[obj.id]
+            if changed:
+                self.model.objects.bulk_update(changed, ['order'])
+                parent.order_version += 1
+                parent.save(update_fields=['order_version'])
+                # Порядок хранится и в документе курса для студентов (courses/outline.py).
+                if self.course_field:
+                    sync_outline(getattr(parent, self.course_field), [parent.id])
+                else:
+                    sync_outline(parent)
+        return self.render_json_response({'saved': 'OK',
+                                          'updated': len(changed),
+                                          'version': parent.order_version})
+
+
+class ModuleOrderView(OrderView):
+    # Нам нужен обработчик, который будет получать новый порядок модулей курса в формате JSON
+    model = Module
+    parent_field = 'course'
+    parent_model = Course
+    owner_lookup = 'owner'
 
 
-class ContentOrderView(CsrfExemptMixin, JsonRequestResponseMixin, View):
+class ContentOrderView(OrderView):
     # аналогичный обработчик для содержимого модулей
-    def post(self, request):
-        for id, order in self.request_json.items():
-            Content.objects.filter(id=id,
-                                   module__course__owner=request.user).update(order=order)
-        return self.render_json_response({'saved': 'OK'})
+    model = Content
+    parent_field = 'module'
+    parent_model = Module
+    owner_lookup = 'course__owner'
+    course_field = 'course'
+
+
+class CacheStatsView(StaffuserRequiredMixin, JSONResponseMixin, View):
+    # Статистика попаданий в кэш по уровням для процесса, обработавшего запрос (см. courses/cache.py).
+    def get(self, request):
+        stats = {}
+        for alias in settings.CACHES:
+            cache = caches[alias]
+            if hasattr(cache, 'get_stats'):
+                stats[alias] = cache.get_stats()
+        return self.render_json_response(stats)
 
 
 class CourseListView(TemplateResponseMixin, View):
@@ -244,15 +440,20 @@ class CourseListView(TemplateResponseMixin, View):
     template_name = 'courses/course/list.html'
     # например, {{ subject.title }} на странице list.html
     def get(self, request, subject=None):
-        subjects = Subject.objects.annotate(
-            total_courses=Count('courses'))
+        # Предметы берутся из кэша в памяти процесса (courses/caching.py) и не запрашиваются из базы.
+        subjects = get_subjects()
         courses = Course.objects.annotate(total_modules=Count('modules'))
         if subject:
-            subject = get_object_or_404(Subject, slug=subject)
+            subject = get_subject_by_slug(subject)
             courses = courses.filter(subject=subject)
+        order = request.GET.get('order')
+        if order == 'popular':
+            # Популярность считается только по заранее собранной статистике просмотров.
+            courses = order_by_popularity(courses)
         return self.render_to_response({'subjects': subjects,
                                         'subject': subject,
-                                        'courses': courses})
+                                        'courses': courses,
+                                        'order': order})
 # При обработке запроса на получение курсов мы выполняем следующие действия:
 #   1) получаем список всех предметов, добавляя количество курсов по каждому из них. Для этого применяем
 # метод annotate() QuerySetʼа и функцию агрегации Count();
@@ -270,6 +471,9 @@ class CourseDetailView(DetailView):
     def get_context_data(self, **kwargs):
         context = super(CourseDetailView, self).get_context_data(**kwargs)
         context['enroll_form'] = CourseEnrollForm(initial={'course': self.object})
+        # Записанному студенту вместо формы записи показываем ссылку на продолжение курса.
+        context['enrolled'] = is_enrolled(self.request.user, self.object)
+        record_course_view(self.object)
         return context
         # Мы переопределяем метод базового класса get_context_data(), чтобы добавить форму в контекст шаблона. Объект
         # формы при этом содержит скрытое поле с ID курса, поэтому при нажатии кнопки на сервер будут отправлены данные
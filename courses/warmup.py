@@ -0,0 +1,107 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from django.apps import apps
+from django.conf import settings
+from django.template import engines, TemplateDoesNotExist, TemplateSyntaxError
+from django.template.utils import get_app_template_dirs
+from django.urls import get_resolver
+
+TEMPLATE_EXTENSIONS = ('.html', '.txt', '.xml')
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(\s*)(\S+)')
+
+
+def template_dirs(project_only=True):
+    dirs = []
+    for engine in engines.all():
+        dirs.extend(getattr(engine, 'engine', engine).dirs)
+    dirs.extend(get_app_template_dirs('templates'))
+    base = str(settings.BASE_DIR)
+    return [str(d) for d in dirs
+            if os.path.isdir(d) and (not project_only or str(d).startswith(base))]
+
+
+def iter_template_names(project_only=True):
+    seen = set()
+    for root in template_dirs(project_only):
+        for path, _, files in os.walk(root):
+            for filename in files:
+                if not filename.endswith(TEMPLATE_EXTENSIONS):
+                    continue
+                name = os.path.relpath(os.path.join(path, filename), root).replace(os.sep, '/')
+                if name not in seen:
+                    seen.add(name)
+                    yield name
+
+
+def warm_templates(project_only=True):
+    # Компилирует все шаблоны проекта. Если включен кэширующий загрузчик (по умолчанию при DEBUG=False),
+    # скомпилированные шаблоны остаются в нем, и первый запрос после запуска не тратит время на разбор.
+    compiled, errors = 0, {}
+    for name in iter_template_names(project_only):
+        for engine in engines.all():
+            try:
+                engine.get_template(name)
+                compiled += 1
+                break
+            except TemplateDoesNotExist:
+                continue
+            except TemplateSyntaxError as e:
+                errors[name] = str(e)
+                break
+    return compiled, errors
+
+
+def prime_url_resolvers():
+    # reverse_dict заполняется при первом вызове reverse() или {% url %}; заполняем его заранее.
+    return len(get_resolver().reverse_dict)
+
+
+def prime_content_types():
+    # Заполняет кэш ContentType одним запросом для всех моделей. Требует доступа к базе.
+    from django.contrib.contenttypes.models import ContentType
+    return len(ContentType.objects.get_for_models(*apps.get_models()))
+
+
+def warm_up_server():
+    # Прогрев при запуске веб-сервера (educa/wsgi.py, educa/asgi.py): только шаблоны и URL, без запросов к базе.
+    # Команды manage.py, рабочие процессы очереди и дочерние процессы пулов его не выполняют.
+    if getattr(settings, 'WARMUP_ON_START', False):
+        warm_templates()
+        prime_url_resolvers()
+
+
+def warm_up(database=True):
+    # Выполняет все этапы прогрева и возвращает время каждого в секундах.
+    timings = {}
+    steps = [('templates', warm_templates), ('urls', prime_url_resolvers)]
+    if database:
+        steps.append(('content_types', prime_content_types))
+    for name, func in steps:
+        start = time.monotonic()
+        result = func()
+        timings[name] = (time.monotonic() - start, result)
+    return timings
+
+
+def measure_imports(top=20):
+    # Запускает отдельный интерпретатор с -X importtime, настраивает Django и загружает ROOT_URLCONF,
+    # как это делает рабочий процесс при первом запросе. Возвращает суммарное время импорта
+    # по пакетам верхнего уровня в миллисекундах.
+    code = ('import django, importlib; django.setup(); '
+            'from django.conf import settings; importlib.import_module(settings.ROOT_URLCONF)')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=str(settings.BASE_DIR),
+                            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    totals = defaultdict(int)
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            # Собственное время модуля (self) относим к его пакету верхнего уровня.
+            totals[match.group(4).split('.')[0]] += int(match.group(1))
+    ranked = sorted(totals.items(), key=lambda item: item[1], reverse=True)
+    return [(package, microseconds / 1000.0) for package, microseconds in ranked[:top]]
@@ -14,3 +14,7 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'educa.settings')
 
 application = get_asgi_application()
+
+# Компилируем шаблоны до первого запроса (WARMUP_ON_START).
+from courses.warmup import warm_up_server  # noqa: E402
+warm_up_server()
@@ -40,11 +40,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'students.apps.StudentsConfig',
+    'jobs.apps.JobsConfig',
     'embed_video',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'courses.middleware.PrecompressedStaticMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -73,9 +75,14 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'educa.wsgi.application'
 
+# Очищает буферы отложенной записи в конце прогона тестов (educa/test_runner.py).
+TEST_RUNNER = 'educa.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/3.1/ref/settings/#databases
+# Для индекса поиска курсов по названию нужно расширение PostgreSQL pg_trgm (пакет postgresql-contrib).
+# Без него миграция courses 0008 только предупреждает и пропускает индекс.
 
 DATABASES = {
     'default': {
@@ -87,6 +94,50 @@ DATABASES = {
 }
 
 
+# Cache
+# Двухуровневый кэш (courses/cache.py): LRU-кэш в памяти каждого процесса поверх общего кэша memcached
+# (нужен пакет python-memcached). В общий кэш пишутся сессии, пользователи, записи на курсы и журнал инвалидации L1,
+# поэтому он должен быть быстрым и с атомарным incr. FileBasedCache для этого не подходит: каждая запись в нем
+# просматривает весь каталог кэша, а incr теряет одновременные увеличения счетчика.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'courses.cache.TwoTierCache',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            # Сессии, пользователи, записи на курсы, ограничение частоты и версия кэша предметов читаются
+            # только из общего кэша: задержка инвалидации L1 для них недопустима (см. courses/cache.py).
+            'L1_EXCLUDE': ['django.contrib.sessions.', 'auth_user:', 'enrolled:', 'throttle:',
+                           'subjects:version'],
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,
+            'SYNC_INTERVAL': 1,
+        },
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+        'LOCATION': os.environ.get('EDUCA_MEMCACHED_LOCATION', '127.0.0.1:11211'),
+    },
+}
+
+
+# Sessions and authentication
+# Сессии хранятся в кэше с записью в базу (cached_db): чтение сессии не обращается к базе, пока она есть в кэше.
+# Если SESSION_SIGNED_COOKIES = True, данные сессии хранятся в подписанной cookie и база не используется вовсе.
+
+SESSION_SIGNED_COOKIES = os.environ.get('EDUCA_SIGNED_COOKIE_SESSIONS') == '1'
+
+if SESSION_SIGNED_COOKIES:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.signed_cookies'
+    SESSION_COOKIE_HTTPONLY = True
+else:
+    SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+
+# Объект пользователя берется из кэша, а не из базы на каждом запросе (см. students/backends.py).
+AUTHENTICATION_BACKENDS = ['students.backends.CachedModelBackend']
+AUTH_USER_CACHE_TIMEOUT = 300
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -124,6 +175,9 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/3.1/howto/static-files/
 
 STATIC_URL = '/static/'
+STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles/')
+# collectstatic добавляет к именам файлов хеш содержимого и сохраняет сжатые копии .gz/.br (см. courses/storage.py).
+STATICFILES_STORAGE = 'courses.storage.CompressedManifestStaticFilesStorage'
 
 # Для реализации перенаправления добавим в файл settings.py проекта educa следующие строки:
 LOGIN_REDIRECT_URL = reverse_lazy('student_course_list')
@@ -133,3 +187,51 @@ LOGIN_REDIRECT_URL = reverse_lazy('student_course_list')
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media/')
+
+# Буфер отметок о просмотре содержимого (students/progress.py): записи сбрасываются в базу пакетом,
+# когда накопится PROGRESS_BUFFER_SIZE событий или пройдет PROGRESS_FLUSH_INTERVAL секунд.
+PROGRESS_BUFFER_SIZE = 500
+PROGRESS_FLUSH_INTERVAL = 10
+
+# Статистика просмотров курсов (courses/analytics.py): счетчики копятся в памяти процесса
+# и сбрасываются в сводную таблицу по интервалам длиной COURSE_VIEWS_BUCKET_SECONDS.
+COURSE_VIEWS_BUCKET_SECONDS = 3600
+COURSE_VIEWS_FLUSH_INTERVAL = 30
+POPULAR_COURSES_DAYS = 30
+
+# Кэш предметов для боковой панели списка курсов (courses/caching.py). Версия кэша хранится в общем кэше
+# и проверяется не чаще раза в SUBJECTS_CACHE_CHECK_INTERVAL секунд.
+SUBJECTS_CACHE_TTL = 3600
+SUBJECTS_CACHE_CHECK_INTERVAL = 1
+
+# Фоновая очередь задач (приложение jobs). Рабочий процесс запускается командой manage.py jobworker.
+JOBS_CONCURRENCY = 4
+JOBS_POLL_INTERVAL = 1
+JOBS_RETRY_BACKOFF = 10
+JOBS_RETRY_BACKOFF_MAX = 3600
+# Рабочий процесс обновляет heartbeat своих задач каждые JOBS_HEARTBEAT_INTERVAL секунд; задачи без heartbeat
+# дольше JOBS_STALE_TIMEOUT секунд возвращаются в очередь.
+JOBS_HEARTBEAT_INTERVAL = 30
+JOBS_STALE_TIMEOUT = 300
+
+# Время хранения в кэше множества курсов студента (students/enrollment.py).
+ENROLLMENT_CACHE_TIMEOUT = 3600
+
+# Компилировать шаблоны проекта и заполнять кэш URL при запуске веб-сервера (educa/wsgi.py, educa/asgi.py).
+# Полный прогрев, включая кэш ContentType, выполняет команда manage.py warmup.
+WARMUP_ON_START = not DEBUG
+
+# Ограничение частоты запросов на сохранение порядка модулей и содержимого: REORDER_RATE запросов в секунду
+# на пользователя с запасом до REORDER_BURST запросов подряд.
+REORDER_RATE = 2
+REORDER_BURST = 5
+
+# Содержимое модуля показывается пачками по CONTENT_BATCH_SIZE объектов; следующие пачки страница подгружает
+# при прокрутке (courses/fragments.py).
+CONTENT_BATCH_SIZE = 20
+# HTML объектов содержимого для страниц студента хранится в кэше отдельно для каждого объекта (courses/outline.py).
+ITEM_HTML_CACHE_TIMEOUT = 24 * 3600
+
+# Массовое создание студентов (students/provisioning.py): меньше PROVISIONING_MIN_PARALLEL паролей
+# хэшируются без пула процессов.
+PROVISIONING_MIN_PARALLEL = 16
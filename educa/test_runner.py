@@ -0,0 +1,11 @@
+from django.test.runner import DiscoverRunner
+from courses.buffers import discard_buffers
+
+
+class TestRunner(DiscoverRunner):
+    # Тесты оставляют просмотры в буферах отложенной записи (courses/buffers.py). Без очистки буферы
+    # сбрасываются через atexit уже после удаления тестовой базы – в базу из настроек проекта.
+
+    def teardown_databases(self, old_config, **kwargs):
+        discard_buffers()
+        super(TestRunner, self).teardown_databases(old_config, **kwargs)
@@ -0,0 +1,9 @@
+from django.contrib import admin
+from .models import Job
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'attempts', 'run_at', 'wait_time', 'duration']
+    list_filter = ['status', 'name']
+    readonly_fields = ['created', 'started', 'worker', 'heartbeat', 'finished', 'wait_time', 'duration', 'last_error']
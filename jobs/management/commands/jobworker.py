@@ -0,0 +1,56 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Q
+from jobs.models import Job
+from jobs.worker import Worker
+
+
+class Command(BaseCommand):
+    help = 'Runs background jobs from the database queue.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int,
+                            default=getattr(settings, 'JOBS_CONCURRENCY', 4),
+                            help='Number of worker threads or processes.')
+        parser.add_argument('--processes', action='store_true',
+                            help='Run jobs in a process pool instead of a thread pool.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'JOBS_POLL_INTERVAL', 1.0))
+        parser.add_argument('--once', action='store_true',
+                            help='Exit when the queue is empty.')
+        parser.add_argument('--stats', action='store_true',
+                            help='Print timing metrics per job name and exit.')
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.print_stats()
+            return
+        worker = Worker(concurrency=options['concurrency'],
+                        processes=options['processes'],
+                        poll_interval=options['poll_interval'],
+                        stale_timeout=getattr(settings, 'JOBS_STALE_TIMEOUT', 300),
+                        stdout=self.stdout if options['verbosity'] > 1 else None)
+        try:
+            stats = worker.run(once=options['once'])
+        except KeyboardInterrupt:
+            stats = worker.stats
+        for name, stat in sorted(stats.items()):
+            runs = stat['done'] + stat['failed'] + stat['retried']
+            self.stdout.write('{}: {} done, {} failed, {} retried, avg {:.3f}s'.format(
+                name, stat['done'], stat['failed'], stat['retried'], stat['total_time'] / runs))
+
+    def print_stats(self):
+        # Метрики по задачам из таблицы очереди: количество, среднее ожидание и выполнение, ошибки.
+        rows = Job.objects.order_by('name').values('name').annotate(
+            total=Count('id'),
+            queued=Count('id', filter=Q(status=Job.QUEUED)),
+            failed=Count('id', filter=Q(status=Job.FAILED)),
+            avg_wait=Avg('wait_time'),
+            avg_duration=Avg('duration'),
+            max_duration=Max('duration'))
+        for row in rows:
+            self.stdout.write('{name}: {total} jobs, {queued} queued, {failed} failed, '
+                              'wait avg {wait:.3f}s, run avg {avg:.3f}s, max {max:.3f}s'.format(
+                                  name=row['name'], total=row['total'], queued=row['queued'],
+                                  failed=row['failed'], wait=row['avg_wait'] or 0,
+                                  avg=row['avg_duration'] or 0, max=row['max_duration'] or 0))
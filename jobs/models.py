@@ -0,0 +1,46 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Job(models.Model):
+    # Задача фоновой очереди. Обработчик запроса только создает строку, а выполняет задачу рабочий процесс,
+    # запущенный командой manage.py jobworker.
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list, blank=True)
+    kwargs = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    created = models.DateTimeField(auto_now_add=True)
+    started = models.DateTimeField(null=True, blank=True)
+    # Рабочий процесс, выполняющий задачу, и время его последнего сигнала о том, что задача еще выполняется.
+    # По устаревшему heartbeat задачи остановленных рабочих процессов возвращаются в очередь.
+    worker = models.CharField(max_length=100, blank=True)
+    heartbeat = models.DateTimeField(null=True, blank=True)
+    finished = models.DateTimeField(null=True, blank=True)
+    # Время ожидания в очереди и время выполнения последней попытки, в секундах.
+    wait_time = models.FloatField(null=True, blank=True)
+    duration = models.FloatField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['run_at']
+        # Рабочий процесс выбирает задачи по условию status='queued' AND run_at <= now() ORDER BY run_at.
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_run_at_idx'),
+        ]
+
+    def __str__(self):
+        return '{} #{} ({})'.format(self.name, self.id, self.status)
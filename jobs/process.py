@@ -0,0 +1,12 @@
+# Точка входа для дочерних процессов пула (jobworker --processes). Модуль не импортирует модели на верхнем уровне:
+# дочерний процесс запускается методом spawn и должен сначала настроить Django.
+
+
+def init_process():
+    import django
+    django.setup()
+
+
+def run_job_in_process(job_id):
+    from .worker import run_job
+    return run_job(job_id)
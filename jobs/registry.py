@@ -0,0 +1,36 @@
+from django.utils import timezone
+from .models import Job
+
+registry = {}
+
+
+class JobFunction(object):
+    def __init__(self, func, name, max_attempts):
+        self.func = func
+        self.name = name
+        self.max_attempts = max_attempts
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        return enqueue(self.name, *args, **kwargs)
+
+
+def job(name=None, max_attempts=3):
+    # Декоратор, регистрирующий функцию как фоновую задачу. Функцию можно вызывать как обычно,
+    # а метод delay() ставит ее в очередь. Аргументы должны сериализоваться в JSON.
+    def decorator(func):
+        job_name = name or '{}.{}'.format(func.__module__, func.__name__)
+        registry[job_name] = JobFunction(func, job_name, max_attempts)
+        return registry[job_name]
+    return decorator
+
+
+def enqueue(name, *args, **kwargs):
+    run_at = kwargs.pop('run_at', None) or timezone.now()
+    max_attempts = kwargs.pop('max_attempts', None)
+    if max_attempts is None:
+        max_attempts = registry[name].max_attempts if name in registry else 3
+    return Job.objects.create(name=name, args=list(args), kwargs=kwargs,
+                              run_at=run_at, max_attempts=max_attempts)
@@ -0,0 +1,88 @@
+from datetime import timedelta
+from django.test import TransactionTestCase
+from django.utils import timezone
+from .models import Job
+from .registry import job, enqueue
+from .worker import RETRY_BACKOFF, RETRY_BACKOFF_MAX, backoff, claim_jobs, requeue_stale, run_job, send_heartbeat
+
+calls = []
+
+
+@job(name='jobs.tests.record')
+def record(value):
+    calls.append(value)
+
+
+@job(name='jobs.tests.fail', max_attempts=2)
+def fail():
+    raise ValueError('failed')
+
+
+class WorkerTests(TransactionTestCase):
+    # run_job() закрывает соединения с базой, поэтому тесты выполняются не внутри транзакции TestCase.
+
+    def setUp(self):
+        del calls[:]
+
+    def test_claim(self):
+        ready = record.delay(1)
+        enqueue('jobs.tests.record', 2, run_at=timezone.now() + timedelta(hours=1))
+        claimed = claim_jobs(10, 'worker-1')
+        self.assertEqual([j.id for j in claimed], [ready.id])
+        ready.refresh_from_db()
+        self.assertEqual((ready.status, ready.worker, ready.attempts), (Job.RUNNING, 'worker-1', 1))
+        self.assertIsNotNone(ready.heartbeat)
+        self.assertEqual(claim_jobs(10, 'worker-2'), [])
+
+    def test_run(self):
+        queued = record.delay(5)
+        claim_jobs(1, 'worker-1')
+        run_job(queued.id)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.DONE)
+        self.assertEqual(calls, [5])
+        self.assertIsNotNone(queued.duration)
+
+    def test_retry_with_backoff(self):
+        queued = fail.delay()
+        claim_jobs(1, 'worker-1')
+        before = timezone.now()
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            run_job(queued.id)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
+        self.assertIn('ValueError', queued.last_error)
+        self.assertGreaterEqual(queued.run_at, before + timedelta(seconds=backoff(1)))
+        # До истечения паузы задача не выдается.
+        self.assertEqual(claim_jobs(1, 'worker-1'), [])
+        Job.objects.filter(id=queued.id).update(run_at=timezone.now())
+        claim_jobs(1, 'worker-1')
+        with self.assertLogs('jobs.worker', 'WARNING'):
+            run_job(queued.id)
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), (Job.FAILED, 2))
+
+    def test_backoff(self):
+        self.assertEqual([backoff(n) for n in (1, 2, 3)],
+                         [RETRY_BACKOFF, RETRY_BACKOFF * 2, RETRY_BACKOFF * 4])
+        self.assertEqual(backoff(100), RETRY_BACKOFF_MAX)
+
+    def test_requeue_stale(self):
+        live, stale = record.delay(1), record.delay(2)
+        claim_jobs(2, 'worker-1')
+        Job.objects.filter(id=stale.id).update(heartbeat=timezone.now() - timedelta(seconds=600))
+        send_heartbeat('worker-1', [live.id])
+        self.assertEqual(requeue_stale(300), 1)
+        live.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((live.status, stale.status), (Job.RUNNING, Job.QUEUED))
+        self.assertEqual(stale.worker, '')
+
+    def test_result_of_requeued_job_is_ignored(self):
+        # Задачу вернули в очередь, пока она выполнялась: результат старой попытки не записывается.
+        queued = record.delay(1)
+        claim_jobs(1, 'worker-1')
+        Job.objects.filter(id=queued.id).update(status=Job.QUEUED, worker='')
+        run_job(queued.id)
+        queued.refresh_from_db()
+        self.assertEqual(queued.status, Job.QUEUED)
@@ -0,0 +1,176 @@
+import logging
+import multiprocessing
+import os
+import socket
+import time
+import traceback
+import uuid
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Job
+from .registry import registry
+from .process import init_process, run_job_in_process
+
+logger = logging.getLogger(__name__)
+
+RETRY_BACKOFF = getattr(settings, 'JOBS_RETRY_BACKOFF', 10)
+RETRY_BACKOFF_MAX = getattr(settings, 'JOBS_RETRY_BACKOFF_MAX', 3600)
+HEARTBEAT_INTERVAL = getattr(settings, 'JOBS_HEARTBEAT_INTERVAL', 30)
+
+
+def make_worker_id():
+    return '{}:{}:{}'.format(socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+
+
+def claim_jobs(limit, worker_id=''):
+    # Забирает до limit готовых к выполнению задач и помечает их как выполняющиеся. В PostgreSQL строки
+    # блокируются через SELECT ... FOR UPDATE SKIP LOCKED, поэтому несколько рабочих процессов не получат
+    # одну и ту же задачу и не ждут друг друга. В SQLite такой блокировки нет: задача считается занятой,
+    # если условный UPDATE ... WHERE status='queued' изменил строку.
+    now = timezone.now()
+    queued = Job.objects.filter(status=Job.QUEUED, run_at__lte=now).order_by('run_at')
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(queued.select_for_update(skip_locked=True)
+                       .values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(status=Job.RUNNING, started=now,
+                                                  worker=worker_id, heartbeat=now,
+                                                  attempts=F('attempts') + 1)
+    else:
+        ids = []
+        for job_id in queued.values_list('id', flat=True)[:limit]:
+            claimed = Job.objects.filter(id=job_id, status=Job.QUEUED)\
+                .update(status=Job.RUNNING, started=now, worker=worker_id, heartbeat=now,
+                        attempts=F('attempts') + 1)
+            if claimed:
+                ids.append(job_id)
+    return list(Job.objects.filter(id__in=ids).order_by('run_at'))
+
+
+def send_heartbeat(worker_id, job_ids):
+    # Отмечает, что задачи еще выполняются этим рабочим процессом.
+    if job_ids:
+        Job.objects.filter(id__in=job_ids, status=Job.RUNNING, worker=worker_id)\
+            .update(heartbeat=timezone.now())
+
+
+def requeue_stale(timeout):
+    # Возвращает в очередь задачи, от рабочего процесса которых больше timeout секунд нет heartbeat
+    # (процесс был остановлен посреди выполнения). Живой рабочий процесс обновляет heartbeat своих задач
+    # каждые HEARTBEAT_INTERVAL секунд, поэтому его долгие задачи не перезапускаются.
+    limit = timezone.now() - timedelta(seconds=timeout)
+    return Job.objects.filter(status=Job.RUNNING, heartbeat__lt=limit)\
+        .update(status=Job.QUEUED, run_at=timezone.now(), worker='', heartbeat=None)
+
+
+def backoff(attempts):
+    return min(RETRY_BACKOFF * 2 ** (attempts - 1), RETRY_BACKOFF_MAX)
+
+
+def run_job(job_id):
+    # Выполняет одну задачу и записывает результат, время ожидания и время выполнения.
+    # Функция вызывается в потоке или дочернем процессе рабочего процесса.
+    try:
+        job = Job.objects.get(id=job_id)
+        func = registry.get(job.name)
+        start = time.monotonic()
+        error = None
+        try:
+            if func is None:
+                raise LookupError('Job "{}" is not registered.'.format(job.name))
+            func(*job.args, **job.kwargs)
+        except Exception:
+            error = traceback.format_exc()
+        duration = time.monotonic() - start
+        now = timezone.now()
+        job.duration = duration
+        job.wait_time = max(0.0, (job.started - job.run_at).total_seconds())
+        if error is None:
+            job.status = Job.DONE
+            job.finished = now
+            job.last_error = ''
+        elif job.attempts < job.max_attempts:
+            job.status = Job.QUEUED
+            job.run_at = now + timedelta(seconds=backoff(job.attempts))
+            job.last_error = error
+        else:
+            job.status = Job.FAILED
+            job.finished = now
+            job.last_error = error
+        # Результат записывается, только если задачу не вернули в очередь и не отдали другому рабочему процессу.
+        Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker)\
+            .update(status=job.status, run_at=job.run_at, finished=job.finished, duration=job.duration,
+                    wait_time=job.wait_time, last_error=job.last_error, heartbeat=None)
+        if error is not None:
+            logger.warning('Job %s failed (attempt %d of %d):\n%s',
+                           job, job.attempts, job.max_attempts, error)
+        return job.name, job.status, duration
+    finally:
+        # Каждый поток или процесс работает со своим соединением; не оставляем его открытым между задачами.
+        connections.close_all()
+
+
+class Worker(object):
+    # Цикл рабочего процесса: забирает задачи из базы пачками и выполняет их в пуле потоков или процессов
+    # (processes=True). Когда очередь пуста, опрашивает базу раз в poll_interval секунд.
+
+    def __init__(self, concurrency=4, processes=False, poll_interval=1.0,
+                 stale_timeout=300, stdout=None):
+        self.concurrency = concurrency
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.stale_timeout = stale_timeout
+        self.stdout = stdout
+        self.stats = {}
+        self.worker_id = make_worker_id()
+
+    def make_pool(self):
+        if self.processes:
+            # spawn: дочерние процессы заново настраивают Django и не делят соединения с родителем.
+            return ProcessPoolExecutor(max_workers=self.concurrency,
+                                       mp_context=multiprocessing.get_context('spawn'),
+                                       initializer=init_process)
+        return ThreadPoolExecutor(max_workers=self.concurrency)
+
+    def record(self, name, status, duration):
+        stat = self.stats.setdefault(name, {'done': 0, 'failed': 0, 'retried': 0, 'total_time': 0.0})
+        key = {Job.DONE: 'done', Job.FAILED: 'failed'}.get(status, 'retried')
+        stat[key] += 1
+        stat['total_time'] += duration
+        if self.stdout:
+            self.stdout.write('{} {} in {:.3f}s'.format(name, status, duration))
+
+    def run(self, once=False):
+        running = {}
+        last_heartbeat = 0
+        with self.make_pool() as pool:
+            while True:
+                if time.monotonic() - last_heartbeat >= HEARTBEAT_INTERVAL:
+                    # Сигнал о своих задачах и проверка чужих: задачи без heartbeat дольше stale_timeout
+                    # выполнял остановленный рабочий процесс.
+                    send_heartbeat(self.worker_id, list(running.values()))
+                    requeue_stale(self.stale_timeout)
+                    last_heartbeat = time.monotonic()
+                free = self.concurrency - len(running)
+                jobs = claim_jobs(free, self.worker_id) if free > 0 else []
+                target = run_job_in_process if self.processes else run_job
+                for job in jobs:
+                    running[pool.submit(target, job.id)] = job.id
+                if not running:
+                    if once:
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                done, _ = wait(running, timeout=self.poll_interval,
+                               return_when=FIRST_COMPLETED)
+                for future in done:
+                    del running[future]
+                    try:
+                        self.record(*future.result())
+                    except Exception:
+                        logger.exception('Job runner crashed')
+        return self.stats
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class StudentsConfig(AppConfig):
     name = 'students'
+
+    def ready(self):
+        # Подключаем обработчики сигналов.
+        from . import signals  # noqa: F401
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.auth.backends import ModelBackend
+from django.core.cache import cache
+
+USER_CACHE_KEY = 'auth_user:{}'
+
+
+def user_cache_key(user_id):
+    return USER_CACHE_KEY.format(user_id)
+
+
+class CachedModelBackend(ModelBackend):
+    # AuthenticationMiddleware на каждом запросе вызывает get_user() бэкенда, и стандартный ModelBackend делает
+    # SELECT из таблицы пользователей. Мы храним объект пользователя в кэше; запись удаляется обработчиками сигналов
+    # из students/signals.py при сохранении или удалении пользователя, так что изменения пароля и is_active
+    # вступают в силу сразу.
+
+    def get_user(self, user_id):
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            user = super(CachedModelBackend, self).get_user(user_id)
+            if user is not None:
+                cache.set(key, user, getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300))
+        return user
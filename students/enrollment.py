@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.cache import cache
+from courses.models import Course
+
+ENROLLED_CACHE_KEY = 'enrolled:{}'
+Enrollment = Course.students.through
+
+
+def enrolled_cache_key(user_id):
+    return ENROLLED_CACHE_KEY.format(user_id)
+
+
+def get_enrolled_course_ids(user):
+    # Множество ID курсов, на которые записан пользователь. Хранится в кэше и сбрасывается обработчиком
+    # m2m_changed для Course.students (students/signals.py), поэтому представлениям не нужен JOIN
+    # через таблицу связи на каждом запросе.
+    if not user.is_authenticated:
+        return frozenset()
+    key = enrolled_cache_key(user.id)
+    course_ids = cache.get(key)
+    if course_ids is None:
+        course_ids = frozenset(Enrollment.objects.filter(user_id=user.id)
+                               .values_list('course_id', flat=True))
+        cache.set(key, course_ids, getattr(settings, 'ENROLLMENT_CACHE_TIMEOUT', 3600))
+    return course_ids
+
+
+def is_enrolled(user, course):
+    # Ответ берется из кэшированного множества. Запись на курс и отчисление сбрасывают его (students/signals.py),
+    # а ключи enrolled: не попадают в локальный кэш процесса (L1_EXCLUDE), поэтому кэшу можно верить
+    # и в отрицательном случае.
+    course_id = course.id if isinstance(course, Course) else int(course)
+    return course_id in get_enrolled_course_ids(user)
+
+
+def invalidate_enrollment(user_ids):
+    cache.delete_many([enrolled_cache_key(user_id) for user_id in user_ids])
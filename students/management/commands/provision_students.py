@@ -0,0 +1,43 @@
+import csv
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from django.db.models import Q
+from courses.models import Course
+from students.provisioning import provision_users, ProvisioningError
+
+
+class Command(BaseCommand):
+    help = 'Creates student accounts in bulk from a CSV file with the header ' \
+           '"username,password,email,first_name,last_name".'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the CSV file.')
+        parser.add_argument('--course', help='ID or slug of a course to enroll the new students in.')
+        parser.add_argument('--processes', type=int,
+                            help='Number of processes for password hashing (default: number of CPUs).')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        course = None
+        if options['course']:
+            lookup = Q(slug=options['course'])
+            if options['course'].isdigit():
+                lookup |= Q(id=int(options['course']))
+            course = Course.objects.filter(lookup).first()
+            if course is None:
+                raise CommandError('Course "{}" does not exist.'.format(options['course']))
+
+        with open(options['csv_file'], newline='', encoding='utf-8') as fileobj:
+            rows = list(csv.DictReader(fileobj))
+        try:
+            created, skipped = provision_users(rows, course=course,
+                                               processes=options['processes'],
+                                               batch_size=options['batch_size'])
+        except (ProvisioningError, IntegrityError) as e:
+            raise CommandError(str(e))
+        for username in skipped:
+            self.stdout.write('Skipped existing user "{}"'.format(username))
+        message = 'Created {} students'.format(len(created))
+        if course is not None:
+            message += ' enrolled in "{}"'.format(course)
+        self.stdout.write(self.style.SUCCESS(message))
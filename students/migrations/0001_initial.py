@@ -0,0 +1,32 @@
+# Generated by Django 3.1 on 2026-10-19 09:06
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('courses', '0004_course_students'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ContentProgress',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_viewed', models.DateTimeField()),
+                ('last_viewed', models.DateTimeField()),
+                ('views', models.PositiveIntegerField(default=1)),
+                ('content', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='progress', to='courses.content')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='content_progress', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'content')},
+            },
+        ),
+    ]
@@ -1,3 +1,21 @@
 from django.db import models
+from django.contrib.auth.models import User
+from courses.models import Content
 
-# Create your models here.
+
+class ContentProgress(models.Model):
+    # Отметка о том, что студент открывал объект содержимого. Записи создаются и обновляются пакетами
+    # из буфера в students/progress.py, а не при каждом просмотре страницы.
+    user = models.ForeignKey(User, related_name='content_progress',
+                             on_delete=models.CASCADE)
+    content = models.ForeignKey(Content, related_name='progress',
+                                on_delete=models.CASCADE)
+    first_viewed = models.DateTimeField()
+    last_viewed = models.DateTimeField()
+    views = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ('user', 'content')
+
+    def __str__(self):
+        return '{} - {}'.format(self.user, self.content_id)
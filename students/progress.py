@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Count, FilteredRelation, IntegerField, Q, Subquery
+from django.utils import timezone
+from courses.buffers import WriteBehindBuffer
+from courses.models import Content
+from .models import ContentProgress
+from .enrollment import get_enrolled_course_ids
+
+
+def _merge(old, new):
+    # Значение в буфере – (первый просмотр, последний просмотр, количество просмотров).
+    return old[0], new[1], old[2] + new[2]
+
+
+def _upsert_sql(rows):
+    table = connection.ops.quote_name(ContentProgress._meta.db_table)
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * rows)
+    # INSERT ... ON CONFLICT поддерживают и PostgreSQL, и SQLite 3.24+.
+    return ('INSERT INTO {table} (user_id, content_id, first_viewed, last_viewed, views) '
+            'VALUES {values} '
+            'ON CONFLICT (user_id, content_id) DO UPDATE SET '
+            'last_viewed = EXCLUDED.last_viewed, '
+            'views = {table}.views + EXCLUDED.views').format(table=table, values=values)
+
+
+def flush_progress(items):
+    # Записывает накопленные просмотры одним INSERT ... ON CONFLICT на пачку строк.
+    # Пользователя или содержимое могли удалить, пока событие лежало в буфере.
+    user_ids = set(User.objects.filter(id__in={user_id for user_id, _ in items})
+                   .values_list('id', flat=True))
+    content_ids = set(Content.objects.filter(id__in={content_id for _, content_id in items})
+                      .values_list('id', flat=True))
+    rows = [(user_id, content_id, first, last, views)
+            for (user_id, content_id), (first, last, views) in items.items()
+            if user_id in user_ids and content_id in content_ids]
+    batch_size = max(1, min(500, (connection.features.max_query_params or 5000) // 5))
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            for i in range(0, len(rows), batch_size):
+                batch = rows[i:i + batch_size]
+                params = [value for row in batch for value in row]
+                cursor.execute(_upsert_sql(len(batch)), params)
+
+
+progress_buffer = WriteBehindBuffer(
+    flush_progress,
+    merge=_merge,
+    max_size=getattr(settings, 'PROGRESS_BUFFER_SIZE', 500),
+    interval=getattr(settings, 'PROGRESS_FLUSH_INTERVAL', 10.0))
+
+
+def record_views(user, content_ids):
+    now = timezone.now()
+    for content_id in content_ids:
+        progress_buffer.add((user.id, content_id), (now, now, 1))
+
+
+def _percent(seen, total):
+    if not total:
+        return 0
+    return round(seen * 100.0 / total, 1)
+
+
+def course_completion(user, course):
+    # Процент пройденного курса для одного студента одним агрегирующим запросом.
+    # FilteredRelation присоединяет только строки этого студента, поэтому строки не размножаются.
+    result = Content.objects.filter(module__course=course)\
+        .annotate(own_progress=FilteredRelation('progress', condition=Q(progress__user=user)))\
+        .aggregate(total=Count('id'), seen=Count('own_progress'))
+    return _percent(result['seen'], result['total'])
+
+
+def user_completion(user):
+    # Проценты по всем курсам студента одним запросом: {ID курса: процент}.
+    rows = Content.objects.filter(module__course_id__in=get_enrolled_course_ids(user))\
+        .annotate(own_progress=FilteredRelation('progress', condition=Q(progress__user=user)))\
+        .order_by()\
+        .values('module__course')\
+        .annotate(total=Count('id'), seen=Count('own_progress'))
+    return {row['module__course']: _percent(row['seen'], row['total']) for row in rows}
+
+
+def course_completion_by_student(course):
+    # Проценты для всех студентов курса одним запросом. Количество объектов содержимого курса
+    # считается подзапросом, а просмотры – агрегацией по связи content_progress.
+    total = Content.objects.filter(module__course=course)\
+        .order_by()\
+        .values('module__course')\
+        .annotate(c=Count('id'))\
+        .values('c')
+    students = course.students.annotate(total=Subquery(total, output_field=IntegerField()),
+                                        seen=Count('content_progress',
+                                                   filter=Q(content_progress__content__module__course=course)))
+    return [(student, _percent(student.seen, student.total)) for student in students]
+
+
+def course_completion_average(course):
+    results = course_completion_by_student(course)
+    if not results:
+        return 0
+    return round(sum(percent for _, percent in results) / len(results), 1)
@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+from jobs.process import init_process
+
+USER_FIELDS = ('username', 'email', 'first_name', 'last_name')
+# Меньше этого количества паролей хэшируем в текущем процессе: запуск пула дороже самого хэширования.
+MIN_PARALLEL_PASSWORDS = getattr(settings, 'PROVISIONING_MIN_PARALLEL', 16)
+
+
+class ProvisioningError(Exception):
+    pass
+
+
+def hash_passwords(passwords, processes=None):
+    # Хэширование паролей – самая дорогая часть создания пользователя (сотни тысяч итераций PBKDF2),
+    # поэтому при массовом создании оно распределяется по пулу процессов. Пустой пароль (None)
+    # превращается в неиспользуемый, как в User.set_unusable_password().
+    passwords = list(passwords)
+    processes = processes or os.cpu_count() or 1
+    if processes < 2 or len(passwords) < MIN_PARALLEL_PASSWORDS:
+        return [make_password(password) for password in passwords]
+    # spawn: дочерние процессы заново настраивают Django (см. jobs/process.py).
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=init_process) as pool:
+        chunksize = max(1, len(passwords) // (processes * 4))
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def provision_users(rows, course=None, processes=None, batch_size=500):
+    # Создает пользователей по списку словарей с ключами username, password и необязательными email,
+    # first_name и last_name. Пользователи вставляются через bulk_create() пачками по batch_size,
+    # пароли хэшируются параллельно (hash_passwords). Уже существующие имена пропускаются.
+    # Если передан course, все созданные пользователи записываются на него одним запросом.
+    # Возвращает (имена созданных пользователей, имена пропущенных).
+    rows = list(rows)
+    usernames = []
+    for number, row in enumerate(rows, 1):
+        username = (row.get('username') or '').strip()
+        if not username:
+            raise ProvisioningError('Row {}: username is required.'.format(number))
+        usernames.append(username)
+    existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    new_rows, skipped, seen = [], [], set()
+    for username, row in zip(usernames, rows):
+        if username in existing or username in seen:
+            skipped.append(username)
+            continue
+        seen.add(username)
+        new_rows.append(dict(row, username=username))
+
+    hashes = hash_passwords([row.get('password') or None for row in new_rows], processes)
+    users = [User(password=password_hash,
+                  **{field: row.get(field) or '' for field in USER_FIELDS})
+             for row, password_hash in zip(new_rows, hashes)]
+    created = [user.username for user in users]
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        if course is not None and created:
+            # bulk_create() в SQLite не возвращает ID, поэтому читаем их по именам.
+            for i in range(0, len(created), batch_size):
+                user_ids = User.objects.filter(username__in=created[i:i + batch_size])\
+                    .values_list('id', flat=True)
+                course.students.add(*user_ids)
+    return created, skipped
@@ -0,0 +1,27 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from courses.models import Course
+from .backends import user_cache_key
+from .enrollment import invalidate_enrollment
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    cache.delete(user_cache_key(instance.pk))
+
+
+@receiver(m2m_changed, sender=Course.students.through)
+def invalidate_enrolled_courses(sender, instance, action, reverse, pk_set, **kwargs):
+    # При прямом изменении (course.students.add()) instance – курс, а pk_set – ID пользователей;
+    # при обратном (user.courses_joined.add()) instance – пользователь.
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            invalidate_enrollment([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        invalidate_enrollment(pk_set)
+    elif action == 'pre_clear':
+        # После clear() список студентов уже не получить, поэтому сбрасываем кэш до удаления связей.
+        invalidate_enrollment(instance.students.values_list('id', flat=True))
@@ -1,3 +1,116 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from courses.buffers import WriteBehindBuffer, discard_buffers
+from courses.models import Subject, Course, Module, Content, Text
+from .enrollment import is_enrolled
+from .models import ContentProgress
+from .progress import flush_progress, progress_buffer, record_views
 
-# Create your tests here.
+
+class ProgressFlushTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        subject = Subject.objects.create(title='Programming', slug='programming')
+        course = Course.objects.create(owner=owner, subject=subject, title='Course', slug='course')
+        module = Module.objects.create(course=course, title='Module')
+        text = Text.objects.create(owner=owner, title='Text', content='text')
+        cls.content = Content.objects.create(module=module, item=text)
+        cls.student = User.objects.create_user('student')
+
+    def setUp(self):
+        discard_buffers()
+
+    def tearDown(self):
+        discard_buffers()
+
+    def test_views_are_merged(self):
+        record_views(self.student, [self.content.id])
+        record_views(self.student, [self.content.id])
+        progress_buffer.flush()
+        self.assertEqual(ContentProgress.objects.get(user=self.student, content=self.content).views, 2)
+
+    def test_deleted_user_and_content_are_skipped(self):
+        other = User.objects.create_user('other')
+        record_views(self.student, [self.content.id, self.content.id + 1000])
+        record_views(other, [self.content.id])
+        other.delete()
+        self.assertEqual(progress_buffer.flush(), 3)
+        self.assertEqual(list(ContentProgress.objects.values_list('user_id', 'content_id')),
+                         [(self.student.id, self.content.id)])
+
+
+class WriteBehindBufferTests(SimpleTestCase):
+
+    def test_failed_flush_is_restored(self):
+        calls = []
+
+        def flush(items):
+            calls.append(dict(items))
+            if len(calls) == 1:
+                raise ValueError
+        buffer = WriteBehindBuffer(flush, merge=lambda old, new: old + new, max_size=100)
+        buffer.add('a', 1)
+        with self.assertLogs('courses.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        buffer.add('a', 2)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(calls[-1], {'a': 3})
+
+    def test_integrity_error_drops_batch(self):
+        def flush(items):
+            raise IntegrityError
+        buffer = WriteBehindBuffer(flush, max_size=100)
+        buffer.add('a', 1)
+        with self.assertLogs('courses.buffers', 'ERROR'):
+            self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(len(buffer), 0)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                       'LOCATION': 'enrollment-tests'}})
+class EnrollmentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        owner = User.objects.create_user('owner')
+        subject = Subject.objects.create(title='Programming', slug='programming')
+        cls.course = Course.objects.create(owner=owner, subject=subject, title='Course', slug='course')
+        cls.student = User.objects.create_user('student')
+
+    def setUp(self):
+        cache.clear()
+        discard_buffers()
+
+    def tearDown(self):
+        discard_buffers()
+
+    def test_negative_answer_is_cached(self):
+        self.assertFalse(is_enrolled(self.student, self.course))
+        with self.assertNumQueries(0):
+            self.assertFalse(is_enrolled(self.student, self.course.id))
+
+    def test_enroll_invalidates(self):
+        self.assertFalse(is_enrolled(self.student, self.course))
+        self.client.force_login(self.student)
+        response = self.client.post(reverse('student_enroll_course'), {'course': self.course.id})
+        self.assertRedirects(response, reverse('student_course_detail', args=[self.course.id]),
+                             fetch_redirect_response=False)
+        self.assertTrue(is_enrolled(self.student, self.course))
+        self.course.students.remove(self.student)
+        self.assertFalse(is_enrolled(self.student, self.course))
+
+    def test_course_detail_shows_enrollment_state(self):
+        url = reverse('course_detail', args=[self.course.slug])
+        self.client.force_login(self.student)
+        self.assertContains(self.client.get(url), 'Enroll now')
+        self.course.students.add(self.student)
+        response = self.client.get(url)
+        self.assertContains(response, 'Continue course')
+        self.assertNotContains(response, 'Enroll now')
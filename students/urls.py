@@ -10,6 +10,8 @@ urlpatterns = [
          name='student_course_list'),
     path('course/<pk>/', views.StudentCourseDetailView.as_view(),
          name='student_course_detail'),
+    path('course/<pk>/<module_id>/contents/', views.StudentModuleContentsView.as_view(),
+         name='student_module_contents'),
     path('course/<pk>/<module_id>/', views.StudentCourseDetailView.as_view(),
          name='student_course_detail_module'),
 ]
\ No newline at end of file
@@ -2,13 +2,23 @@ from django.shortcuts import render
 from django.urls import reverse_lazy
 from django.views.generic.edit import CreateView
 from django.contrib.auth.forms import UserCreationForm
-from django.contrib.auth import authenticate, login
+from django.contrib.auth import login
 from django.views.generic.edit import FormView
 from django.contrib.auth.mixins import LoginRequiredMixin
 from .forms import CourseEnrollForm
 from django.views.generic.list import ListView
-from courses.models import Course
+from courses.models import Course, CourseOutline
 from django.views.generic.detail import DetailView
+from .progress import record_views, user_completion
+from courses.analytics import record_course_view
+from courses.fragments import parse_batch_params, iter_fragments, render_more_link
+from courses.outline import get_outline, find_module, outline_batch
+from django.http import Http404, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.urls import reverse
+from django.views.generic.base import View
+from braces.views import JSONResponseMixin
+from .enrollment import get_enrolled_course_ids, is_enrolled
 
 
 class StudentRegistrationView(CreateView):
@@ -18,10 +28,9 @@ class StudentRegistrationView(CreateView):
 
     def form_valid(self, form):
         result = super(StudentRegistrationView, self).form_valid(form)
-        cd = form.cleaned_data
-        user = authenticate(username=cd['username'],
-                            password=cd['password1'])
-        login(self.request, user)
+        # Пароль уже проверен формой и захэширован при сохранении. Повторный authenticate() пересчитал бы хэш
+        # еще раз, поэтому входим под только что созданным пользователем, явно указав бэкенд.
+        login(self.request, self.object, backend='students.backends.CachedModelBackend')
         return result
 # Это обработчик регистрации студентов на сайте. Мы используем специальный класс CreateView, который предоставляет
 # методы создания объектов заданной модели. Также мы определяем несколько атрибутов модели:
@@ -58,7 +67,16 @@ class StudentCourseListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         qs = super(StudentCourseListView, self).get_queryset()
-        return qs.filter(students__in=[self.request.user])
+        # ID курсов студента берем из кэша вместо JOIN через таблицу связи.
+        return qs.filter(id__in=get_enrolled_course_ids(self.request.user))
+
+    def get_context_data(self, **kwargs):
+        context = super(StudentCourseListView, self).get_context_data(**kwargs)
+        # Проценты прохождения всех курсов студента получаем одним запросом.
+        completion = user_completion(self.request.user)
+        for course in context['object_list']:
+            course.completion = completion.get(course.id, 0)
+        return context
 # Этот обработчик будет формировать список курсов, слушателем которых является студент. Мы используем примесь
 # LoginRequiredMixin, чтобы только авторизованные пользователи могли иметь доступ к этой странице. Наш обработчик также
 # наследуется от класса ListView, чтобы отображать объекты модели Course в виде списка. Чтобы получить только курсы,
@@ -66,27 +84,101 @@ class StudentCourseListView(LoginRequiredMixin, ListView):
 # ManyToManyField со студентом.
 
 
+CONTENTS_PLACEHOLDER = '<!-- module contents -->'
+MORE_PLACEHOLDER = '<!-- more contents -->'
+
+
+def get_enrolled_outline(user, course_id):
+    # Документ курса (courses/outline.py) для записанного на курс студента, иначе 404.
+    # Запись на курс проверяется по кэшированному множеству курсов, сам курс из базы не читается.
+    try:
+        course_id = int(course_id)
+    except ValueError:
+        raise Http404('No course found.')
+    if not is_enrolled(user, course_id):
+        raise Http404('You are not enrolled in this course.')
+    try:
+        return get_outline(course_id)
+    except Course.DoesNotExist:
+        raise Http404('No course found.')
+
+
+def get_outline_module(outline, module_id=None):
+    # Модуль из документа курса по ID или первый модуль, если ID не передан.
+    if module_id is None:
+        return find_module(outline.data)
+    try:
+        module = find_module(outline.data, int(module_id))
+    except ValueError:
+        module = None
+    if module is None:
+        raise Http404('No module found.')
+    return module
+
+
 class StudentCourseDetailView(DetailView):
-    model = Course
+    model = CourseOutline
     template_name = 'students/course/detail.html'
 
-    def get_queryset(self):
-        qs = super(StudentCourseDetailView, self).get_queryset()
-        return qs.filter(students__in=[self.request.user])
+    def get_object(self, queryset=None):
+        # Страница строится по документу курса – одной строке CourseOutline вместо запросов к курсу,
+        # модулям, содержимому и таблицам объектов содержимого.
+        return get_enrolled_outline(self.request.user, self.kwargs['pk'])
 
     def get_context_data(self, **kwargs):
         context = super(StudentCourseDetailView, self).get_context_data(**kwargs)
-        # Получаем объект курса.
-        course = self.get_object()
-        if 'module_id' in self.kwargs:
-            # Получаем текущий модуль по параметрам запроса.
-            context['module'] = course.modules.get(id=self.kwargs['module_id'])
-        else:
-            # Получаем первый модуль.
-            context['module'] = course.modules.all()[0]
+        context['course'] = self.object.data
+        # Текущий модуль по параметрам запроса или первый модуль курса.
+        context['module'] = get_outline_module(self.object, self.kwargs.get('module_id'))
+        if context['module']:
+            record_course_view(self.object.course_id, context['module']['id'])
         return context
+
+    def render_to_response(self, context, **response_kwargs):
+        # Страница отдается потоком: сначала все, что выше содержимого модуля, затем HTML первой пачки
+        # содержимого по одному объекту и в конце остаток страницы. Браузер начинает отрисовку, не дожидаясь
+        # всего модуля; следующие пачки страница подгружает через StudentModuleContentsView.
+        context['contents_placeholder'] = CONTENTS_PLACEHOLDER
+        context['more_placeholder'] = MORE_PLACEHOLDER
+        html = render_to_string(self.get_template_names(), context, request=self.request)
+        head, rest = html.split(CONTENTS_PLACEHOLDER, 1)
+        middle, tail = rest.split(MORE_PLACEHOLDER, 1)
+        return StreamingHttpResponse(self.stream_contents(context['module'], head, middle, tail),
+                                     **response_kwargs)
+
+    def stream_contents(self, module, head, middle, tail):
+        yield head
+        contents, next_cursor = outline_batch(module) if module else ([], None)
+        # Отмечаем просмотр показанного содержимого. Событие попадает в буфер и записывается в базу пакетом.
+        record_views(self.request.user, [content['id'] for content in contents])
+        for fragment in iter_fragments(contents, 'students/course/content.html'):
+            yield fragment
+        yield middle
+        if module:
+            # Ссылка на следующую пачку известна только после выборки первой.
+            yield render_more_link(reverse('student_module_contents',
+                                           args=[self.object.course_id, module['id']]),
+                                   next_cursor)
+        yield tail
 # Это обработчик StudentCourseDetailView. Мы переопределили метод get_queryset(), чтобы ограничить QuerySet курсов
 # и работать только с теми, на которые записан текущий пользователь. Мы также переопределили метод get_context_data(),
 # чтобы добавить в контекст шаблона данные о модуле, если его идентификатор был передан в параметре module_id URLʼа.
 # В противном случае мы показываем содержимое первого модуля. Так студенты смогут переходить от одного модуля курса
 # к другому.
+
+
+class StudentModuleContentsView(JSONResponseMixin, View):
+    # Следующая пачка содержимого модуля для страницы StudentCourseDetailView:
+    #   GET ?after=<order последнего показанного объекта>&limit=<n>
+    #   -> {"html": HTML пачки, "next": курсор следующей пачки или null}
+    def get(self, request, pk, module_id):
+        outline = get_enrolled_outline(request.user, pk)
+        module = get_outline_module(outline, module_id)
+        try:
+            after, limit = parse_batch_params(request.GET)
+        except ValueError:
+            return self.render_json_response({'error': 'Invalid cursor.'}, status=400)
+        contents, next_cursor = outline_batch(module, after, limit)
+        record_views(request.user, [content['id'] for content in contents])
+        html = ''.join(iter_fragments(contents, 'students/course/content.html'))
+        return self.render_json_response({'html': html, 'next': next_cursor})